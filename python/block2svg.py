@@ -1,19 +1,55 @@
 #! /usr/bin/env python3
 
-""" convert DXF block entities into SVG XML or PNG files """
+""" convert DXF block entities into SVG XML or PNG files or a single SVG
+    sprite sheet of symbols with an optional PNG texture atlas,
+    SVG output is written directly as path data strings, drawsvg is
+    needed for PNG output only """
 
 import sys
 import os
+import re
+import json
 import fnmatch
 import argparse
-from math import hypot, sin, cos, atan, atan2, pi
+import contextlib
+from io import StringIO
+from multiprocessing import Pool
+from math import hypot, sin, cos, atan, atan2, pi, ceil, sqrt, radians
+from xml.sax.saxutils import escape, quoteattr
 import ezdxf
+from ezdxf import path
+from ezdxf.path import Command
+from block_manifest import block_hash, load_manifest, save_manifest
 try: 
     import drawSvg as draw
 except:
-    import drawsvg as draw  # drawsvg 2.4 and above
-    draw.Drawing.saveSvg = draw.Drawing.save_svg
-    draw.Drawing.savePng = draw.Drawing.save_svg
+    try:
+        import drawsvg as draw  # drawsvg 2.4 and above
+        draw.Drawing.saveSvg = draw.Drawing.save_svg
+        draw.Drawing.savePng = draw.Drawing.save_svg
+    except ImportError:
+        draw = None     # no PNG output
+
+# converter and loaded DXF drawing in a worker process
+WORKER = {}
+# hashes of converted blocks in the output folder
+MANIFEST = 'block2svg_manifest.json'
+SVG_ROOT = '<?xml version="1.0" encoding="UTF-8"?>\n' \
+    '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"'
+NOT_ID_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+SVG_DIGITS = 3          # decimals of coordinates in SVG path data
+BULGE_TOL = 1e-9        # smaller bulges are straight segments
+# curve entities converted to path data by ezdxf
+CURVE_ENTITIES = ('ELLIPSE', 'SPLINE')
+
+def num(value):
+    """ compact number format for SVG
+
+        :param value: number
+        :returns: string with at most SVG_DIGITS decimals
+    """
+    res = f'{value:.{SVG_DIGITS}f}'.rstrip('0').rstrip('.')
+    return '0' if res == '-0' else res
 
 class Block2():
     """ class to convert DXF blocks to other symbol formats
@@ -21,17 +57,23 @@ class Block2():
         :param dxf_name: input DXF to process
         :param block_name: glob pattern for block names to convert (* = all)
         :param out_path: path to folder to write SVGs/PNGs
-        :param out_type: svg or png
+        :param out_type: svg, png or sprite
         :param width: width of SVG
         :param height: height of SVG
         :param verbose: verbose output
         :param scale: scale for CAD coordinates, use -1 * scale for drawsvg >= 2.0
+                      (PNG output), the sign is not used for SVG output
         :param lwidth: line width in SVG
         :param color: line and fill color in SVG
+        :param jobs: number of parallel processes to render blocks
+        :param incremental: convert changed and new blocks only, remove
+                            outputs of deleted blocks, using a manifest
+        :param atlas: write PNG texture atlas too in sprite mode
     """
 
     def __init__(self, dxf_name, block_name, out_path, out_type,
-                 width, height, verbose, scale, lwidth, color):
+                 width, height, verbose, scale, lwidth, color, jobs=1,
+                 incremental=False, atlas=False):
         """ initialize """
         self.dxf_name = dxf_name
         self.block_name = block_name
@@ -44,29 +86,378 @@ class Block2():
         self.yscale = scale
         self.line_width = lwidth
         self.color = color
+        self.jobs = jobs
+        self.incremental = incremental
+        self.atlas = atlas
 
-    def convert(self):
-        """ convert blocks """
+    def load(self):
+        """ load the DXF file
+
+            :returns: ezdxf drawing
+        """
         try:
-            doc = ezdxf.readfile(self.dxf_name)
+            return ezdxf.readfile(self.dxf_name)
         except IOError:
             print(f"*** ERROR Not a DXF file or a generic I/O error: {self.dxf_name}")
             sys.exit()
         except ezdxf.DXFStructureError:
             print(f"*** ERROR Invalid or corrupted DXF file: {self.dxf_name}")
             sys.exit()
-        for block in doc.blocks:
-            if not block.name.startswith("*"): # skip special blocks
-                if fnmatch.fnmatch(block.name, self.block_name):
-                    if self.verbose:
-                        print(block.name)
-                    res = self.block2svg(block)
-                    if self.out_type == 'png':
-                        res.savePng(os.path.join(self.out_path,
-                                    block.name + '.' + self.out_type))
-                    elif self.out_type == 'svg':
-                        res.saveSvg(os.path.join(self.out_path,
-                                    block.name + '.' + self.out_type))
+
+    def out_file(self, name):
+        """ output file of a block
+
+            :param name: block name
+            :returns: path to output file
+        """
+        return os.path.join(self.out_path, name + '.' + self.out_type)
+
+    def render_params(self):
+        """ parameters changing the output of blocks
+
+            :returns: dictionary of parameters
+        """
+        return {'type': self.out_type, 'width': self.width,
+                'height': self.height, 'xscale': self.xscale,
+                'yscale': self.yscale, 'line_width': self.line_width,
+                'color': self.color,
+                'writer': 'drawsvg' if self.out_type == 'png' else 'native'}
+
+    def convert(self):
+        """ convert blocks, blocks are rendered and saved by parallel
+            processes if more jobs are given, each process loads the
+            DXF file once, errors are reported after all blocks,
+            in incremental mode unchanged blocks are skipped
+        """
+        if self.out_type == 'png' and draw is None:
+            print("*** ERROR drawsvg is not installed, no PNG output")
+            return
+        doc = self.load()
+        names = [block.name for block in doc.blocks
+                 if not block.name.startswith("*") and   # skip special blocks
+                 fnmatch.fnmatch(block.name, self.block_name)]
+        if self.out_type == 'sprite':
+            if self.incremental:
+                print("Incremental mode is not supported for sprites, all blocks converted")
+            self.sprite(doc, names)
+            return
+        if self.incremental:
+            manifest_file = os.path.join(self.out_path, MANIFEST)
+            manifest = load_manifest(manifest_file)
+            done = manifest.get(self.out_type, {})    # hashes by block name
+            params = self.render_params()
+            hashes = {name: block_hash(doc.blocks.get(name), params)
+                      for name in names}
+            n_blocks = len(names)
+            names = [name for name in names if done.get(name) != hashes[name]
+                     or not os.path.exists(self.out_file(name))]
+            removed = [name for name in done if name not in doc.blocks]
+            if self.verbose:
+                print(f"{n_blocks - len(names)} unchanged blocks skipped")
+        errors = []
+        if self.jobs > 1 and len(names) > 1:
+            doc = None  # workers load their own copy
+            with Pool(min(self.jobs, len(names)), initializer=init_worker,
+                      initargs=(self, )) as pool:
+                for name, error, output in pool.imap(block_job, names,
+                                                     chunksize=16):
+                    print(output, end="")
+                    if error is not None:
+                        errors.append((name, error))
+        else:
+            for name in names:
+                error = self.convert_block(doc.blocks.get(name))
+                if error is not None:
+                    errors.append((name, error))
+        for name, error in errors:
+            print(f"*** ERROR {name}: {error}")
+        if self.verbose or errors:
+            print(f"{len(names) - len(errors)} of {len(names)} blocks converted")
+        if self.incremental:
+            done.update((name, hashes[name]) for name in names)
+            for name, _ in errors:
+                del done[name]  # convert again next time
+            for name in removed:
+                if os.path.exists(self.out_file(name)):
+                    os.remove(self.out_file(name))
+                del done[name]
+            if self.verbose and removed:
+                print(f"{len(removed)} outputs of removed blocks deleted")
+            manifest[self.out_type] = done
+            save_manifest(manifest_file, manifest)
+
+    def convert_block(self, block):
+        """ render a block and save it to the output folder
+
+            :param block: block definition
+            :returns: error message, None if converted
+        """
+        if self.verbose:
+            print(block.name)
+        try:
+            if self.out_type == 'png':
+                self.block2svg(block).savePng(self.out_file(block.name))
+            elif self.out_type == 'svg':
+                with open(self.out_file(block.name), 'w', encoding='utf-8') as f:
+                    f.write(self.block2svg_text(block))
+        except Exception as e:
+            return str(e) or type(e).__name__
+        return None
+
+    def view_box(self):
+        """ view box of block SVGs, the base point is in the center
+
+            :returns: list of x, y, width, height
+        """
+        return [-self.width / 2, -self.height / 2, self.width, self.height]
+
+    def svg_content(self, block):
+        """ render a block to SVG elements
+
+            :param block: block definition
+            :returns: view box (x, y, width, height) and SVG elements as string
+        """
+        return self.view_box(), self.svg_elements(block)
+
+    def block2svg_text(self, block):
+        """ export block to an SVG document without drawsvg
+
+            :param block: block definition
+            :returns: SVG document as string
+        """
+        box = ' '.join(f'{v:g}' for v in self.view_box())
+        return SVG_ROOT + f' width="{self.width:g}" height="{self.height:g}" ' \
+            f'viewBox="{box}">\n{self.svg_elements(block)}\n</svg>\n'
+
+    def svg_elements(self, block):
+        """ convert block entities to SVG elements, lines and curves are
+            joined into a single path, filled hatches are separate paths
+
+            :param block: block definition
+            :returns: SVG elements as string
+        """
+        x0, y0, _ = block.base_point    # basepoint of block
+        scale = self.xscale
+
+        def xy(x, y):
+            """ SVG coordinates of a CAD point, y axis downwards """
+            return f'{num((x - x0) * scale)},{num((y0 - y) * scale)}'
+
+        strokes = []    # path data of lines and curves
+        fills = []      # path data of filled hatches
+        texts = []
+        for entity in block:
+            typ = entity.dxftype()
+            dxf = entity.dxf
+            if typ == "LINE":
+                strokes.append(f'M{xy(dxf.start[0], dxf.start[1])}L{xy(dxf.end[0], dxf.end[1])}')
+            elif typ in ("CIRCLE", "ARC"):
+                cx, cy, _ = dxf.center
+                r = dxf.radius
+                rr = f'{num(r * scale)},{num(r * scale)}'
+                sweep = 360.0
+                if typ == "ARC":
+                    sweep = (dxf.end_angle - dxf.start_angle) % 360 or 360.0
+                if sweep == 360.0:  # two half circles
+                    strokes.append(f'M{xy(cx + r, cy)}A{rr} 0 1 0 {xy(cx - r, cy)}'
+                                   f'A{rr} 0 1 0 {xy(cx + r, cy)}Z')
+                else:   # counterclockwise
+                    start = radians(dxf.start_angle)
+                    end = start + radians(sweep)
+                    strokes.append(f'M{xy(cx + r * cos(start), cy + r * sin(start))}'
+                                   f'A{rr} 0 {int(sweep > 180)} 0 '
+                                   f'{xy(cx + r * cos(end), cy + r * sin(end))}')
+            elif typ == "LWPOLYLINE":
+                pnts = entity.get_points('xyb')
+                if pnts:
+                    strokes.append(self.bulge_path(pnts, entity.closed, xy))
+            elif typ == "POLYLINE":
+                if entity.get_mode() in ('AcDb2dPolyline', 'AcDb3dPolyline'):
+                    pnts = [(v.dxf.location[0], v.dxf.location[1], v.dxf.bulge)
+                            for v in entity.vertices]
+                    if pnts:
+                        strokes.append(self.bulge_path(pnts, entity.is_closed, xy))
+                else:
+                    print(f'Unsupported POLYLINE mode: {entity.get_mode()}, {block.name}')
+            elif typ in CURVE_ENTITIES:
+                strokes.append(self.path_data(path.make_path(entity), xy))
+            elif typ == "HATCH":
+                if dxf.solid_fill == 1:
+                    fills.append(''.join(self.path_data(p, xy)
+                                         for p in path.from_hatch(entity)))
+                else:
+                    print(f'HATCH with solid fill are only supported: {block.name}')
+            elif typ == "TEXT":
+                x, y, _ = entity.get_placement()[1]
+                pos = xy(x, y).split(',')
+                attrs = f'x="{pos[0]}" y="{pos[1]}" font-size="{num(dxf.height * scale)}"'
+                if dxf.rotation:
+                    attrs += f' transform="rotate({num(-dxf.rotation)} {pos[0]} {pos[1]})"'
+                texts.append(f'<text {attrs} fill={quoteattr(self.color)}>'
+                             f'{escape(dxf.text)}</text>')
+            else:
+                print(f'Unsupported entity type: {typ}, {block.name}')
+        color = quoteattr(self.color)
+        elements = []
+        if strokes:
+            elements.append(f'<path d="{"".join(strokes)}" fill="none" stroke={color} '
+                            f'stroke-width="{self.line_width}"/>')
+        for data in fills:
+            elements.append(f'<path d="{data}" fill={color} fill-rule="evenodd" '
+                            f'stroke={color} stroke-width="{self.line_width}"/>')
+        return '\n'.join(elements + texts)
+
+    def bulge_path(self, pnts, closed, xy):
+        """ path data of a polyline with arc segments
+
+            :param pnts: list of (x, y, bulge) in CAD coordinates
+            :param closed: closed polyline
+            :param xy: function to convert CAD coordinates to SVG string
+            :returns: path data string
+        """
+        data = [f'M{xy(pnts[0][0], pnts[0][1])}']
+        n = len(pnts)
+        for i in range(n if closed else n - 1):
+            x1, y1, bulge = pnts[i]
+            x2, y2, _ = pnts[(i + 1) % n]
+            if abs(bulge) > BULGE_TOL:
+                r = num(hypot(x2 - x1, y2 - y1) * (1 + bulge * bulge) /
+                        (4 * abs(bulge)) * self.xscale)
+                data.append(f'A{r},{r} 0 {int(abs(bulge) > 1)} '
+                            f'{0 if bulge > 0 else 1} {xy(x2, y2)}')
+            elif not (closed and i == n - 1):   # closed by Z
+                data.append(f'L{xy(x2, y2)}')
+        if closed:
+            data.append('Z')
+        return ''.join(data)
+
+    @staticmethod
+    def path_data(curve, xy):
+        """ path data of an ezdxf path
+
+            :param curve: ezdxf path
+            :param xy: function to convert CAD coordinates to SVG string
+            :returns: path data string
+        """
+        data = [f'M{xy(curve.start[0], curve.start[1])}']
+        for cmd in curve.commands():
+            if cmd.type == Command.LINE_TO:
+                data.append(f'L{xy(cmd.end[0], cmd.end[1])}')
+            elif cmd.type == Command.CURVE3_TO:
+                data.append(f'Q{xy(cmd.ctrl[0], cmd.ctrl[1])} {xy(cmd.end[0], cmd.end[1])}')
+            elif cmd.type == Command.CURVE4_TO:
+                data.append(f'C{xy(cmd.ctrl1[0], cmd.ctrl1[1])} '
+                            f'{xy(cmd.ctrl2[0], cmd.ctrl2[1])} {xy(cmd.end[0], cmd.end[1])}')
+            else:   # MOVE_TO, next sub-path
+                data.append(f'M{xy(cmd.end[0], cmd.end[1])}')
+        if curve.is_closed:
+            data.append('Z')
+        return ''.join(data)
+
+    def sprite(self, doc, names):
+        """ write blocks as symbols into a single SVG file with a JSON index
+            of symbol ids and view boxes, optionally a PNG texture atlas
+            with a JSON map of the symbol positions (pixels from top left)
+
+            :param doc: DXF drawing
+            :param names: names of blocks to convert
+        """
+        base = os.path.join(self.out_path,
+                            os.path.splitext(os.path.basename(self.dxf_name))[0])
+        if self.jobs > 1 and len(names) > 1:
+            with Pool(min(self.jobs, len(names)), initializer=init_worker,
+                      initargs=(self, )) as pool:
+                results = []
+                for name, res, output in pool.imap(symbol_job, names,
+                                                   chunksize=16):
+                    print(output, end="")
+                    results.append((name, res))
+        else:
+            results = [(name, self.symbol_content(doc.blocks.get(name)))
+                       for name in names]
+        symbols = []
+        index = {}
+        ids = set()
+        for name, res in results:
+            if isinstance(res, str):
+                print(f"*** ERROR {name}: {res}")
+                continue
+            view_box, content = res
+            # block names may contain characters not valid in XML ids
+            symbol_id = NOT_ID_CHARS.sub('_', name)
+            while symbol_id in ids:
+                symbol_id += '_'
+            ids.add(symbol_id)
+            box = ' '.join(f'{v:g}' for v in view_box)
+            symbols.append(f'<symbol id="{symbol_id}" viewBox="{box}">\n{content}\n</symbol>\n')
+            index[name] = {'id': symbol_id, 'viewBox': view_box}
+        self.write_text(base + '_sprite.svg',
+                        SVG_ROOT + '>\n' + ''.join(symbols) + '</svg>\n')
+        self.write_text(base + '_sprite.json', json.dumps(index, indent=1))
+        print(f"{len(index)} of {len(names)} blocks written to {base}_sprite.svg")
+        if self.atlas and index:
+            self.texture_atlas(base, symbols, index)
+
+    def symbol_content(self, block):
+        """ render a block to the content of a sprite symbol
+
+            :param block: block definition
+            :returns: view box and SVG elements, error message on error
+        """
+        if self.verbose:
+            print(block.name)
+        try:
+            return self.svg_content(block)
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+    def texture_atlas(self, base, symbols, index):
+        """ write a PNG texture atlas of symbols in a grid of equal cells
+
+            :param base: path and base name of output files
+            :param symbols: list of SVG symbol definitions
+            :param index: symbol id and view box by block name
+        """
+        try:
+            import cairosvg     # needed for PNG atlas only
+        except (ImportError, OSError):  # package or cairo library missing
+            print("*** ERROR cairosvg and cairo are needed for PNG atlas, "
+                  "install them (pip install cairosvg), no PNG atlas")
+            return
+        cols = ceil(sqrt(len(index)))
+        rows = ceil(len(index) / cols)
+        width, height = self.width, self.height
+        uses = []
+        coords = {}
+        for i, (name, symbol) in enumerate(index.items()):
+            x = (i % cols) * width
+            y = (i // cols) * height
+            uses.append(f'<use xlink:href="#{symbol["id"]}" x="{x:g}" y="{y:g}" '
+                        f'width="{width:g}" height="{height:g}"/>\n')
+            coords[name] = {'x': x, 'y': y, 'width': width, 'height': height}
+        svg = SVG_ROOT + f' width="{cols * width:g}" height="{rows * height:g}" ' \
+            f'viewBox="0 0 {cols * width:g} {rows * height:g}">\n' + \
+            ''.join(symbols) + ''.join(uses) + '</svg>\n'
+        try:
+            cairosvg.svg2png(bytestring=svg.encode('utf-8'),
+                             write_to=base + '_atlas.png')
+        except Exception as e:
+            print(f"*** ERROR PNG atlas not written: {e}")
+            return
+        self.write_text(base + '_atlas.json', json.dumps(coords, indent=1))
+
+    @staticmethod
+    def write_text(file_name, text):
+        """ write a text file
+
+            :param file_name: name of output file
+            :param text: content
+        """
+        try:
+            with open(file_name, 'w', encoding='utf-8') as f:
+                f.write(text)
+        except OSError:
+            print(f"*** ERROR Cannot write file: {file_name}")
 
     @staticmethod
     def bulge_arc(start, end, bulge):
@@ -242,6 +633,37 @@ class Block2():
                 print(f'Unsupported entity type: {typ}, {block.name}')
         return d
 
+def init_worker(block2):
+    """ load the DXF file once in a worker process
+
+        :param block2: Block2 converter
+    """
+    WORKER['block2'] = block2
+    WORKER['doc'] = block2.load()
+
+def block_job(name):
+    """ convert a block in a worker process
+
+        :param name: block name
+        :returns: block name, error message or None, printed output
+    """
+    output = StringIO()
+    with contextlib.redirect_stdout(output):
+        error = WORKER['block2'].convert_block(WORKER['doc'].blocks.get(name))
+    return name, error, output.getvalue()
+
+def symbol_job(name):
+    """ render a sprite symbol in a worker process
+
+        :param name: block name
+        :returns: block name, view box and SVG elements or error message,
+                  printed output
+    """
+    output = StringIO()
+    with contextlib.redirect_stdout(output):
+        res = WORKER['block2'].symbol_content(WORKER['doc'].blocks.get(name))
+    return name, res, output.getvalue()
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('name', metavar='file_name', type=str, nargs=1,
@@ -251,29 +673,38 @@ if __name__ == "__main__":
     parser.add_argument('-o', '--out_path', type=str, default='.',
                         help='path to save SVG/PNG files to')
     parser.add_argument('-t', '--type', type=str, default='svg',
-                        help='Output type svg/png, default=svg')
+                        help='Output type svg/png/sprite, default=svg')
     parser.add_argument('-w', '--width', type=float, default=500.0,
                         help='SVG or image width, default=500')
     parser.add_argument('-e', '--height', type=float, default=500.0,
                         help='SVG or image height, default=500')
     parser.add_argument('-s', '--scale', type=float, default=40.0,
-                        help='scale, use negative scale for SVG 2, default=40')
+                        help='scale, use negative scale for PNG with drawsvg 2, default=40')
     parser.add_argument('-l', '--lwidth', type=int, default=5,
                         help='line width, default=5')
     parser.add_argument('-c', '--color', type=str, default="black",
                         help='color, default=black')
     parser.add_argument('-v', '--verbose', action="store_true",
                         help='verbose output to stdout')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of parallel processes, default 1')
+    parser.add_argument('-i', '--incremental', action="store_true",
+                        help='Convert changed blocks only, delete outputs of removed blocks, not for sprite')
+    parser.add_argument('-a', '--atlas', action="store_true",
+                        help='Write PNG texture atlas in sprite mode too')
 
     args = parser.parse_args()
     if not os.path.isdir(args.out_path):
         raise argparse.ArgumentTypeError(f"Output path does not exists: {args.out_path}")
     if not os.access(args.out_path, os.W_OK):
         raise argparse.ArgumentTypeError(f"Output path is not writeable: {args.out_path}")
-    if not args.type in ('png', 'svg'):
-        raise argparse.ArgumentTypeError("Output type must be 'svg' or 'png'")
+    if not args.type in ('png', 'svg', 'sprite'):
+        raise argparse.ArgumentTypeError("Output type must be 'svg', 'png' or 'sprite'")
+    if args.type == 'sprite' and args.incremental:
+        raise argparse.ArgumentTypeError("Incremental mode is not supported for sprite output")
 
     b = Block2(args.name[0], args.block, args.out_path, args.type,
                args.width, args.height, args.verbose, args.scale,
-               args.lwidth, args.color)
+               args.lwidth, args.color, args.jobs, args.incremental,
+               args.atlas)
     b.convert()
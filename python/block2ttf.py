@@ -37,6 +37,7 @@ import argparse
 import time
 import array
 import ezdxf
+from block_manifest import block_hash, load_manifest, save_manifest
 
 from fontTools.ttLib import TTFont, newTable
 from fontTools.ttLib.tables import ttProgram
@@ -417,6 +418,14 @@ class TT():
 
         return bitmap
 
+    def font_file(self):
+        """ name of the TTF file to write, the DXF name with .ttf extension
+            if no output name is given or its folder does not exist
+        """
+        if self.out_file is None or not os.path.exists(os.path.dirname(self.out_file)):
+            return self.dxf_name + '.ttf'
+        return self.out_file
+
     def saveFont(self):
         """ TODO """
         unicodes = [code for glyph in self.glyphs for code in self.glyphs[glyph][1]]
@@ -437,11 +446,10 @@ class TT():
         self.makeTable_name("Regular", copyrightYear, creator, version)
         self.makeTable_post()
 
-        if self.out_file is None:
-            self.out_file = self.dxf_name + '.ttf'
-        elif not os.path.exists(os.path.dirname(self.out_file)):
+        font_file = self.font_file()
+        if self.out_file is not None and font_file != self.out_file:
             print(f'out_file parameter has not a valid file or path name')
-            self.out_file = self.dxf_name + '.ttf'
+        self.out_file = font_file
 
         self.ttfont.save( self.out_file )
 
@@ -737,9 +745,11 @@ class Block2TTF():
         :param scale: scale for CAD coordinates
         :param line_width: line width in SVG
         :param verbose: verbose output
+        :param incremental: reuse contours of unchanged blocks from the manifest
     """
 
-    def __init__(self, dxf_name, charcodes, block_name, out_file, fontname, unitsPerEm, scale, line_width, verbose):
+    def __init__(self, dxf_name, charcodes, block_name, out_file, fontname, unitsPerEm, scale, line_width, verbose,
+                 incremental=False):
         """ initialize """
         self.dxf_name = dxf_name
         self.charcodes_file = charcodes
@@ -748,6 +758,7 @@ class Block2TTF():
         self.scale = scale
         self.line_width = line_width
         self.verbose = verbose
+        self.incremental = incremental
 
         self.tt = TT(dxf_name,out_file, fontname, unitsPerEm, line_width)
         self.block_contours = []
@@ -758,12 +769,36 @@ class Block2TTF():
 
         # processing input dxf file
         doc = ezdxf.readfile(self.dxf_name)
+        cache = {}      # hash and contours of blocks from the manifest
+        if self.incremental:
+            # manifest is next to the font file actually written
+            manifest_file = os.path.splitext(self.tt.font_file())[0] + '_manifest.json'
+            cache = load_manifest(manifest_file)
+            params = {'scale': self.scale, 'line_width': self.line_width}
+        new_cache = {}
+        n_skipped = 0
         for block in doc.blocks:
             if not block.name.startswith("*"): # skip special blocks
                 if fnmatch.fnmatch(block.name, self.block_name):
+                    if self.incremental:
+                        hash_value = block_hash(block, params)
+                        cached = cache.get(block.name)
+                        if isinstance(cached, dict) and cached.get('hash') == hash_value:
+                            # unchanged block, contours from the manifest
+                            if cached['contours'] is not None:
+                                self.block_contours.append([block.name, cached['contours']])
+                            new_cache[block.name] = cached
+                            n_skipped += 1
+                            continue
                     if self.verbose:
                         print(block.name)
+                    n = len(self.block_contours)
                     self.block2tt(block)
+                    if self.incremental:
+                        contours = self.block_contours[-1][1] if len(self.block_contours) > n else None
+                        new_cache[block.name] = {'hash': hash_value, 'contours': contours}
+        if self.incremental and self.verbose:
+            print(f"{n_skipped} unchanged blocks skipped")
 
         if self.charcodes_file is None:
             # without "--charcodes" parameter characters assigned to blocks in the order of the blocks in DXF
@@ -812,6 +847,10 @@ class Block2TTF():
                 print("Input charcode file {0} successfully processed.".format(self.charcodes_file))
 
         self.tt.saveFont()
+        if self.incremental:
+            # blocks removed from the DXF are dropped from the manifest
+            save_manifest(os.path.splitext(self.tt.out_file)[0] + '_manifest.json',
+                          new_cache)
 
 
     def block2tt(self, block):
@@ -838,9 +877,6 @@ class Block2TTF():
                 yc = (entity.dxf.center[1] - y0) * self.scale
                 r = entity.dxf.radius * self.scale
 
-                if block.name =="Segelykero":
-                    a=1
-
                 kulso = Point(xc,yc).buffer(r+self.line_width/2, resolution=6)
                 belso = Point(xc,yc).buffer(r-self.line_width/2, resolution=6)
                 circlebuf = Polygon( kulso.exterior, ([belso.exterior] if not belso.is_empty else [])  )
@@ -1011,9 +1047,11 @@ if __name__ == "__main__":
                         help='line width, default=32')
     parser.add_argument('-v', '--verbose', action="store_true",
                         help='verbose output to stdout')
+    parser.add_argument('-i', '--incremental', action="store_true",
+                        help='Reuse contours of unchanged blocks from the manifest next to the output')
 
     args = parser.parse_args()
 
     b = Block2TTF(args.name[0], args.charcodes, args.block, args.out_file, args.fontname,
-                  args.units_per_em, args.scale, args.lwidth, args.verbose)
+                  args.units_per_em, args.scale, args.lwidth, args.verbose, args.incremental)
     b.convert()
@@ -0,0 +1,72 @@
+#! /usr/bin/env python3
+"""
+    Helper functions for incremental conversion of DXF blocks,
+    a stable hash is calculated for each block definition from its
+    normalized entity data and the render parameters, the hashes of the
+    converted blocks are stored in a JSON manifest next to the outputs
+"""
+import json
+import hashlib
+from ezdxf.lldxf.tagwriter import TagCollector
+
+# group codes of handles and pointers, they change on every save
+HANDLE_CODES = frozenset([5, 105, 390, 1005] + list(range(320, 370)))
+DIGITS = 9  # decimals of floats in hash
+
+def normalize(value):
+    """ stable string representation of a tag value
+
+        :param value: tag value (number, string or vertex)
+        :returns: string
+    """
+    if isinstance(value, float):
+        return repr(round(value, DIGITS) + 0.0)     # no -0.0
+    if isinstance(value, (str, int)):
+        return str(value)
+    return ' '.join(normalize(v) for v in value)
+
+def block_hash(block, params):
+    """ hash of a block definition and the render parameters
+
+        :param block: block definition
+        :param params: render parameters in a JSON serializable dictionary
+        :returns: hexadecimal hash
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(normalize(block.base_point).encode())
+    collector = TagCollector(dxfversion=block.doc.dxfversion)
+    for entity in block:
+        entity.export_dxf(collector)
+    for tag in collector.tags:
+        if tag.code not in HANDLE_CODES:
+            digest.update(f"{tag.code}\n{normalize(tag.value)}\n".encode())
+    return digest.hexdigest()
+
+def load_manifest(file_name):
+    """ load a manifest file
+
+        :param file_name: name of JSON manifest
+        :returns: dictionary from the manifest, empty if not exists or invalid
+    """
+    try:
+        with open(file_name, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        print(f"Invalid manifest file, all blocks converted: {file_name}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def save_manifest(file_name, data):
+    """ write a manifest file
+
+        :param file_name: name of JSON manifest
+        :param data: dictionary to write
+    """
+    try:
+        with open(file_name, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+    except OSError:
+        print(f"Error writing manifest file: {file_name}")
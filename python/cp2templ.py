@@ -1,15 +1,37 @@
 #! /usr/bin/env python3
-"""
+r"""
     Copy entites from one DXF drawing to another using a template
     the names of the layers and the inserted blocks are preserved but
     the layer and block tables are not copied
     Layer and block names are optionally  replaced using lookup tables
+    lookup table lines contain source and target name separated by semicolon,
+    the source name may be a glob pattern (e.g. ROAD_*;roads) or a regular
+    expression after re: prefix (e.g. re:WALL_(\d+);wall_\1)
+    In batch mode (more input files or directories) the template and the
+    translator tables are loaded once, the output file parameter is the
+    output directory
+
+    python cp2templ.py -t templ.dxf -o out.dxf input.dxf
+    python cp2templ.py -t templ.dxf -o out_dir --jobs 4 input_dir
 """
 import sys
 import os
+import re
+import fnmatch
 import argparse
+import json
+import glob
+import contextlib
+from io import StringIO
+from multiprocessing import Pool
+from collections import Counter
 import ezdxf
+from ezdxf.document import Drawing
 from ezdxf.addons import Importer
+from ezdxf.addons.importer import new_clean_entity, remove_dependencies
+from dxf_writer import save_dxf, drop_duplicate_vertices
+from dxf_convert import polyline2lwpolyline, merge_lines, Transformation, \
+    MERGE_TOLERANCE
 
 # 3D vertices are changed to 2D verices in the 3D polyline by ezdxf (AutoCAD 2023 doesn't like it)
 # a workaround added in the code
@@ -18,28 +40,117 @@ BYLAYER_COLOR = 256         # BYLAYER color
 BYLAYER_LTYPE = "BYLAYER"   # BYLAYER linetype
 BYLAYER_LWEIGHT = -1        # BYLAYER lineweight
 # supported entiies
-ENTITIES = ['POINT', 'INSERT', 'TEXT', 'MTEXT', 'LINE', 'LWPOLYLINE',
+ENTITIES = {'POINT', 'INSERT', 'TEXT', 'MTEXT', 'LINE', 'LWPOLYLINE',
             'MLINE', 'MPOLYGON', 'ARC', 'CIRCLE', 'DIMENSION',
-            'ARCDIMENSION', 'ELLIPSE', 'HATCH', 'INSERT', 'LEADER',
-            'POLYLINE', 'REGION', 'SHAPE', 'SOLID', 'SPLINE', 'TRACE']
+            'ARCDIMENSION', 'ELLIPSE', 'HATCH', 'LEADER',
+            'POLYLINE', 'REGION', 'SHAPE', 'SOLID', 'SPLINE', 'TRACE'}
+# entities imported one by one by the Importer in bulk mode too,
+# INSERTs as in normal mode, the Importer takes care of their blocks
+IMPORTER_ENTITIES = {'DIMENSION', 'ARCDIMENSION', 'ARC_DIMENSION', 'LEADER',
+                     'MLINE', 'MPOLYGON', 'INSERT'}
+BATCH_SIZE = 10000          # number of entities inserted together in bulk mode
+GLOB_CHARS = re.compile(r'[*?[]')   # glob pattern in translator table
+REGEX_PREFIX = 're:'                # regular expression in translator table
+BACK_REF = re.compile(r'\\[1-9]|\(\?P=')   # back reference in regular expression
+
+class Translator():
+    """ translator table for layer or block names, exact names are stored in
+        a dictionary, glob and regular expression rules are compiled into
+        a single regular expression, the first matching rule is used,
+        the result is cached for each distinct source name
+
+        :param exact: dictionary of source and target names
+        :param patterns: list of (compiled regex, target, is_regex) in table order
+    """
+    def __init__(self, exact, patterns):
+        """ initialize """
+        self.exact = exact
+        self.patterns = patterns
+        self.cache = {}
+        self.dispatch = None
+        # back references would change meaning in the combined expression
+        if patterns and not any(BACK_REF.search(p[0].pattern) for p in patterns):
+            try:
+                self.dispatch = re.compile('|'.join(
+                    f'(?P<p{i}>{p[0].pattern})' for i, p in enumerate(patterns)))
+            except re.error:    # e.g. same group names, check one by one
+                self.dispatch = None
+
+    def translate(self, name):
+        """ translate name using the table
+
+            :param name: name in the source drawing
+            :returns: translated name or the original name if no rule matches
+        """
+        try:
+            return self.cache[name]
+        except KeyError:
+            pass
+        res = self.exact.get(name)
+        if res is None and self.patterns:
+            index = None
+            if self.dispatch is not None:
+                match = self.dispatch.fullmatch(name)
+                if match:
+                    index = next(i for i in range(len(self.patterns))
+                                 if match.group(f'p{i}') is not None)
+            else:
+                index = next((i for i, p in enumerate(self.patterns)
+                              if p[0].fullmatch(name)), None)
+            if index is not None:
+                pattern, target, is_regex = self.patterns[index]
+                if is_regex:
+                    res = pattern.fullmatch(name).expand(target)
+                else:
+                    res = target
+        if res is None:
+            res = name
+        self.cache[name] = res
+        return res
 
 class Cp2Templ():
     """
         :param dxf_file: entities are copied from this file
-        :param template_file: entities are copied to this file
+        :param template_file: entities are copied to this file or a loaded template drawing
         :param out_file: the template is saved using this name
-        :param layer_table: translator table for layer names
-        :param block_table: translator table for block names
+        :param layer_table: translator table file or Translator for layer names
+        :param block_table: translator table file or Translator for block names
+        :param precision: number of decimals for coordinates in output, None no rounding
+        :param drop_duplicates: drop consecutive polyline vertices identical after rounding
+        :param lwpolyline: convert 2D POLYLINE to LWPOLYLINE in output
+        :param bulk: copy entities in batches bypassing the Importer
+        :param samples: maximal number of sample handles of skipped entities
+        :param report: name of JSON report file, None no report
+        :param transformation: Transformation applied to copied entities, None no transformation
+        :param merge: tolerance to join lines with coincident end points on
+                      the same layer, None no merge
+        :param jobs: number of processes to write the output
     """
     def __init__(self, dxf_file, template_file, out_file, layer_table,
-                 block_table):
+                 block_table, precision=None, drop_duplicates=False,
+                 lwpolyline=False, bulk=False, samples=0, report=None,
+                 transformation=None, merge=None, jobs=1):
         """ intialize """
         self.dxf_file = dxf_file
         self.template_file = template_file
+        if isinstance(template_file, Drawing):
+            self.template_file = template_file.filename
         # add missing extension to output file
         if len(os.path.splitext(out_file[1])) == 0:
             out_file += '.dxf'
         self.out_file = out_file
+        self.precision = precision
+        self.drop_duplicates = drop_duplicates
+        self.lwpolyline = lwpolyline
+        self.bulk = bulk
+        self.n_samples = samples
+        self.report = report
+        self.transformation = transformation
+        self.merge = merge
+        self.jobs = jobs
+        self.n_copied = 0
+        self.skipped = Counter()    # skipped entities by (reason, type, layer/block)
+        self.samples = {}           # sample handles of skipped entities
         try:
             self.doc = ezdxf.readfile(dxf_file)
         except IOError:
@@ -48,71 +159,227 @@ class Cp2Templ():
         except ezdxf.DXFStructureError:
             print(f"*** ERROR Invalid or corrupted DXF file: {dxf_file}")
             sys.exit()
+        if isinstance(template_file, Drawing):
+            self.templ = template_file
+        else:
+            self.templ = self.load_template(template_file)
+        # file name or loaded Translator, empty name (GUI) no table
+        self.layer_table = None
+        if layer_table:
+            self.layer_table = layer_table
+            if isinstance(layer_table, str):
+                self.layer_table = self.load_table(layer_table)
+        self.block_table = None
+        if block_table:
+            self.block_table = block_table
+            if isinstance(block_table, str):
+                self.block_table = self.load_table(block_table)
+
+    @staticmethod
+    def load_template(template_file):
+        """ load template drawing
+
+            :param template_file: name of template DXF file
+            :returns: ezdxf drawing
+        """
         try:
-            self.templ = ezdxf.readfile(template_file)
+            return ezdxf.readfile(template_file)
         except IOError:
             print(f"*** ERROR Not a DXF file or a generic I/O error: {template_file}")
             sys.exit()
         except ezdxf.DXFStructureError:
             print(f"*** ERROR Invalid or corrupted DXF file: {template_file}")
             sys.exit()
-        self.layer_table = None
-        if layer_table:
-            self.layer_table = self.load_table(layer_table)
-        self.block_table = None
-        if block_table:
-            self.block_table = self.load_table(block_table)
 
     @staticmethod
     def load_table(file_name):
         """ load two column translator table for layers or blocks
             fields are separated by semicolon (;)
-            first column contains the name in original dxf file
-            second column contains the name in the template file
+            first column contains the name in original dxf file,
+            a glob pattern or a regular expression with re: prefix
+            second column contains the name in the template file,
+            it may contain group references for regular expressions,
+            for repeated exact names the last line is used
         """
         try:
             f = open(file_name, "r")
         except:
             print(f"translator table not loaded and not used: {file_name}")
             return None
-        table = {}
+        exact = {}
+        patterns = []
         for line in f:
             lst = line.strip('\n\r\t ').split(';')
             if len(lst) != 2:
-                print("Translator table line skipped:\n{line}")
+                print(f"Translator table line skipped:\n{line}")
                 continue
-            table[lst[0]] = lst[1]
+            if lst[0].startswith(REGEX_PREFIX):
+                try:
+                    patterns.append((re.compile(lst[0][len(REGEX_PREFIX):]),
+                                     lst[1], True))
+                except re.error:
+                    print(f"Invalid regular expression, line skipped:\n{line}")
+            elif GLOB_CHARS.search(lst[0]):
+                patterns.append((re.compile(fnmatch.translate(lst[0])),
+                                 lst[1], False))
+            else:
+                if lst[0] in exact:     # last rule is used
+                    print(f"Duplicated name in translator table, last rule used: {lst[0]}")
+                exact[lst[0]] = lst[1]
         f.close()
-        return table
+        return Translator(exact, patterns)
+
+    @staticmethod
+    def bylayer_attribs(entity, e_layer):
+        """ DXF attributes to set on copied entities
+
+            :param entity: source entity
+            :param e_layer: target layer name
+            :returns: dictionary of DXF attributes
+        """
+        dxfattribs = {}
+        for attr, value in (('layer', e_layer), ('color', BYLAYER_COLOR),
+                            ('linetype', BYLAYER_LTYPE),
+                            ('lineweight', BYLAYER_LWEIGHT)):
+            if entity.is_supported_dxf_attrib(attr):
+                dxfattribs[attr] = value
+        return dxfattribs
+
+    @staticmethod
+    def new_entity(entity, dxfattribs):
+        """ copy an entity without source document dependencies
+
+            :param entity: source entity
+            :param dxfattribs: DXF attributes to set on the copy
+            :returns: new entity not bound to any document
+        """
+        new = new_clean_entity(entity)
+        dxf = new.dxf
+        for attr in ('plotstyle_handle', 'material_handle', 'visualstyle_handle'):
+            dxf.discard(attr)
+        # values are checked once by bylayer_attribs, no check per entity
+        for attr, value in dxfattribs.items():
+            dxf.unprotected_set(attr, value)
+        e_typ = new.dxftype()
+        if e_typ == 'POLYLINE':
+            for v in new.vertices:
+                remove_dependencies(v)
+                # vertices are on the layer of the polyline
+                v.dxf.unprotected_set('layer', dxfattribs['layer'])
+                if 'linetype' in dxfattribs:
+                    v.dxf.unprotected_set('linetype', dxfattribs['linetype'])
+                # hack for 3D Polyline with 2D vetices
+                if new.is_3d_polyline and v.is_2d_polyline_vertex:
+                    v.dxf.flags |= v.POLYLINE_3D_VERTEX
+        elif e_typ == 'HATCH':
+            new.dxf.discard('associative')
+        return new
+
+    def add_entities(self, entities, layout):
+        """ add new entities to the template drawing
+
+            :param entities: list of entities created by new_entity
+            :param layout: target layout in template drawing
+        """
+        db = self.templ.entitydb
+        block_record = layout.block_record
+        for entity in entities:
+            entity.doc = self.templ
+            db.add(entity)      # with ATTRIB, VERTEX and SEQEND
+            block_record.add_entity(entity)
+
+    def skip(self, reason, entity, e_typ, name):
+        """ register a skipped entity
+
+            :param reason: reason of skip
+            :param entity: skipped entity
+            :param e_typ: type of entity
+            :param name: layer or block name
+        """
+        key = (reason, e_typ, name)
+        self.skipped[key] += 1
+        if self.n_samples > 0:
+            handles = self.samples.setdefault(key, [])
+            if len(handles) < self.n_samples:
+                handles.append(entity.dxf.handle)
+
+    def summary(self):
+        """ print summary table of skipped entities """
+        print(f"{self.n_copied} entities copied")
+        if len(self.skipped) == 0:
+            return
+        print(f"{'skip reason':30s} {'type':12s} {'layer/block':32s} {'count':>8s}")
+        for key, n in sorted(self.skipped.items()):
+            line = f"{key[0]:30s} {key[1]:12s} {key[2]:32s} {n:8d}"
+            if key in self.samples:
+                line += " " + ",".join(self.samples[key])
+            print(line)
+        print(f"{sum(self.skipped.values())} entities skipped")
+
+    def report_data(self):
+        """ copied and skipped entities for the JSON report
+
+            :returns: dictionary
+        """
+        skipped = [{"reason": key[0], "type": key[1], "name": key[2],
+                    "count": n, "handles": self.samples.get(key, [])}
+                   for key, n in sorted(self.skipped.items())]
+        return {"source": self.dxf_file, "template": self.template_file,
+                "output": self.out_file, "copied": self.n_copied,
+                "skipped": skipped}
+
+    def save_report(self):
+        """ write copied and skipped entities to the JSON report """
+        save_json(self.report, self.report_data())
 
     def copy(self):
         """ Copy entities is layer/block match
         """
         importer = Importer(self.doc, self.templ)
         # blocks in template
-        templ_blocks = [block.name for block in self.templ.blocks]
+        templ_blocks = {block.name for block in self.templ.blocks}
         # layers in template
-        templ_layers = [layer.dxf.name for layer in self.templ.layers]
+        templ_layers = {layer.dxf.name for layer in self.templ.layers}
         msp = self.doc.modelspace() # source drawing modespace
         templ_doc = self.templ.modelspace()
+        attribs = {}    # new DXF attributes by entity type and layer
+        batch = []      # new entities to add in bulk mode
+        styles = set()  # text styles of entities in batches
+        n_templ = len(templ_doc)    # entities in template before copy
         for entity in msp:
             e_typ = entity.dxftype()
             e_layer = entity.dxf.layer
-            if self.layer_table and e_layer in self.layer_table:
-                e_layer = self.layer_table[e_layer] # translate layer name
+            if self.layer_table:
+                e_layer = self.layer_table.translate(e_layer) # translate layer name
             if e_typ not in ENTITIES:
-                print(f'unsupported entitiy skipped: {e_typ}')
+                self.skip('unsupported entity', entity, e_typ, e_layer)
                 continue    # skip unsupported entities
             if e_layer not in templ_layers:
-                print(f'no layer in template drawing entity skipped {e_layer}')
+                self.skip('no layer in template', entity, e_typ, e_layer)
                 continue    # skip entity on missing layer
             if e_typ == 'INSERT':
                 b_name = entity.dxf.name
-                if self.block_table and b_name in self.block_table:
-                    b_name = self.block_table[b_name]
+                if self.block_table:
+                    b_name = self.block_table.translate(b_name)
                 if b_name not in templ_blocks:
-                    print(f'no block definition in template drawing skipped {b_name}')
+                    self.skip('no block in template', entity, e_typ, b_name)
                     continue    # skip missing blocks in template
+            self.n_copied += 1
+            if self.bulk and e_typ not in IMPORTER_ENTITIES:
+                key = (e_typ, e_layer)
+                if key not in attribs:
+                    attribs[key] = self.bylayer_attribs(entity, e_layer)
+                new = self.new_entity(entity, attribs[key])
+                if new.dxf.is_supported('style'):
+                    styles.add(new.dxf.get('style', 'Standard'))
+                batch.append(new)
+                if len(batch) >= BATCH_SIZE:
+                    self.add_entities(batch, templ_doc)
+                    batch = []
+                continue
+            # keep source order
+            self.add_entities(batch, templ_doc)
+            batch = []
             if entity.is_supported_dxf_attrib('layer'):
                 entity.dxf.layer = e_layer
             if entity.is_supported_dxf_attrib('color'):
@@ -128,26 +395,214 @@ class Cp2Templ():
                         if v.is_2d_polyline_vertex:
                             v.dxf.flags |= v.POLYLINE_3D_VERTEX
             importer.import_entity(entity, templ_doc)
+        self.add_entities(batch, templ_doc)
+        # missing table entries of batches are imported by the importer
+        importer.import_table('styles', sorted(styles))
         importer.finalize()
+        if self.transformation is not None:
+            _, n_failed = self.transformation.transform_entities(list(templ_doc)[n_templ:])
+            if n_failed:
+                print(f"{n_failed} entities not transformed")
+        if self.lwpolyline:
+            if self.templ.dxfversion > 'AC1009':
+                polyline2lwpolyline(templ_doc)
+            else:
+                print("LWPOLYLINE is not supported by DXF R12 template, POLYLINE not converted")
+        if self.merge is not None:
+            n_merged, n_new = merge_lines(templ_doc, list(templ_doc)[n_templ:],
+                                          self.merge)
+            print(f"{n_merged} lines merged into {n_new} polylines")
+        if self.precision is not None and self.drop_duplicates:
+            drop_duplicate_vertices(self.templ, self.precision)
+        self.summary()
+        if self.report:
+            self.save_report()
         try:
-            self.templ.saveas(self.out_file)
+            save_dxf(self.templ, self.out_file, self.precision, self.jobs)
         except:
             print("Error writing DXF file, try to convert the source DXF files using ODAFileConverter before processing")
 
+def save_json(file_name, data):
+    """ write data to a JSON file
+
+        :param file_name: name of JSON file
+        :param data: data to write
+    """
+    try:
+        with open(file_name, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    except OSError:
+        print(f"Error writing report file: {file_name}")
+
+# template and options shared by batch jobs in a worker process
+BATCH = {}
+
+def init_batch(templ_data, template_file, layer_table, block_table, options):
+    """ initialize batch jobs in a worker process
+
+        :param templ_data: template drawing serialized by encode_base64
+        :param template_file: name of template DXF file
+        :param layer_table: Translator for layer names or None
+        :param block_table: Translator for block names or None
+        :param options: dictionary of Cp2Templ keyword parameters
+    """
+    BATCH['templ'] = templ_data
+    BATCH['template_file'] = template_file
+    BATCH['layer_table'] = layer_table
+    BATCH['block_table'] = block_table
+    BATCH['options'] = options
+
+def batch_job(job):
+    """ copy one source file into a fresh copy of the template
+
+        :param job: tuple of source and output file names
+        :returns: source file name, report data or None on error, printed output
+    """
+    dxf_file, out_file = job
+    output = StringIO()
+    data = None
+    with contextlib.redirect_stdout(output):
+        try:
+            templ = ezdxf.decode_base64(BATCH['templ'])
+            templ.filename = BATCH['template_file']
+            cp = Cp2Templ(dxf_file, templ, out_file, BATCH['layer_table'],
+                          BATCH['block_table'], **BATCH['options'])
+            cp.copy()
+            data = cp.report_data()
+        except SystemExit:  # input file not loaded
+            pass
+        except Exception as e:
+            print(f"*** ERROR {dxf_file}: {e}")
+    return dxf_file, data, output.getvalue()
+
+def batch_files(names):
+    """ collect DXF files from the list of files and directories
+
+        :param names: list of file and directory names
+        :returns: list of DXF file names
+    """
+    files = []
+    for name in names:
+        if os.path.isdir(name):
+            files += sorted(glob.glob(os.path.join(name, '*.[dD][xX][fF]')))
+        else:
+            files.append(name)
+    return files
+
+def batch(dxf_files, template_file, out_dir, layer_table=None,
+          block_table=None, jobs=1, report=None, **options):
+    """ copy many source files into the same template, the template and
+        the translator tables are loaded once, the template is serialized
+        and each job gets a fresh copy of it
+
+        :param dxf_files: list of source DXF files
+        :param template_file: template DXF file
+        :param out_dir: output directory, output file names are the same as the
+                        source names, source files are never overwritten
+        :param layer_table: translator table file for layer names
+        :param block_table: translator table file for block names
+        :param jobs: number of parallel processes
+        :param report: name of JSON report file for all jobs, None no report
+        :param options: other Cp2Templ keyword parameters
+    """
+    job_list = [(name, os.path.join(out_dir, os.path.basename(name)))
+                for name in dxf_files]
+    outputs = {}    # real output path: source name
+    for name, out_file in job_list:
+        out_path = os.path.normcase(os.path.realpath(out_file))
+        if out_path == os.path.normcase(os.path.realpath(name)):
+            print(f"*** ERROR Output would overwrite the source file: {name}")
+            return
+        if out_path in outputs:
+            print(f"*** ERROR Same output file {out_file} for {outputs[out_path]} and {name}")
+            return
+        outputs[out_path] = name
+    templ = Cp2Templ.load_template(template_file)
+    templ_data = templ.encode_base64()
+    layers = Cp2Templ.load_table(layer_table) if layer_table else None
+    blocks = Cp2Templ.load_table(block_table) if block_table else None
+    os.makedirs(out_dir, exist_ok=True)
+    init_args = (templ_data, template_file, layers, blocks, options)
+    results = []
+    if jobs > 1:
+        with Pool(jobs, initializer=init_batch, initargs=init_args) as pool:
+            for res in pool.imap(batch_job, job_list):
+                print(f"--- {res[0]}\n{res[2]}", end="")
+                results.append(res)
+    else:
+        init_batch(*init_args)
+        for job in job_list:
+            res = batch_job(job)
+            print(f"--- {res[0]}\n{res[2]}", end="")
+            results.append(res)
+    failed = [res[0] for res in results if res[1] is None]
+    print(f"{len(results) - len(failed)} of {len(results)} files converted")
+    for name in failed:
+        print(f"failed: {name}")
+    if report:
+        save_json(report, [res[1] for res in results if res[1] is not None])
+
 if __name__ == "__main__":
     # process command line parameters
     parser = argparse.ArgumentParser()
-    parser.add_argument('name', metavar='file_name', type=str, nargs=1,
-                        help='DXF file to copy from')
+    parser.add_argument('name', metavar='file_name', type=str, nargs='+',
+                        help='DXF files or directories to copy from')
     parser.add_argument('-t', '--template', type=str, required=True,
                         help='Template DXF to copy to')
     parser.add_argument('-o', '--out_file', type=str, required=True,
-                        help='output DXF file name')
+                        help='output DXF file name, output directory in batch mode')
     parser.add_argument('-l', '--layer_table', type=str, default=None,
                         help='Layer name translator table')
     parser.add_argument('-b', '--block_table', type=str, default=None,
                         help='Block name translator table')
+    parser.add_argument('-p', '--precision', type=int, default=None,
+                        help='Number of decimals for coordinates in output')
+    parser.add_argument('-d', '--drop_duplicates', action="store_true",
+                        help='Drop consecutive polyline vertices identical after rounding')
+    parser.add_argument('-w', '--lwpolyline', action="store_true",
+                        help='Convert 2D POLYLINE to LWPOLYLINE, DXF R2000+ template')
+    parser.add_argument('-u', '--bulk', action="store_true",
+                        help='Copy entities in batches bypassing per entity import')
+    parser.add_argument('-s', '--samples', type=int, default=0,
+                        help='Number of sample handles listed for skipped entities, default 0')
+    parser.add_argument('-r', '--report', type=str, default=None,
+                        help='JSON report file of copied and skipped entities')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of parallel processes in batch mode or to write output, default 1')
+    parser.add_argument('-f', '--transform', type=str, default=None,
+                        help='Helmert transformation parameters tx,ty,rotation,scale (rotation in degrees counterclockwise)')
+    parser.add_argument('-c', '--control', type=str, default=None,
+                        help='Control point file to fit transformation, lines: x y x_target y_target')
+    parser.add_argument('-a', '--affine', action="store_true",
+                        help='Fit affine transformation to control points instead of Helmert')
+    parser.add_argument('-m', '--merge', action="store_true",
+                        help='Join lines with coincident end points on the same layer')
+    parser.add_argument('--merge_tol', type=float, default=MERGE_TOLERANCE,
+                        help=f'Tolerance for coincident end points, default {MERGE_TOLERANCE}')
     args = parser.parse_args()
+    trans = None
+    if args.control:
+        trans = Transformation.from_file(args.control, args.affine)
+        if trans is None:
+            sys.exit()
+    elif args.transform:
+        try:
+            trans = Transformation.helmert(*(float(v) for v in args.transform.split(',')))
+        except (ValueError, TypeError):
+            print(f"Invalid transformation parameters: {args.transform}")
+            sys.exit()
+    if trans is not None:
+        trans.report()
+    merge = args.merge_tol if args.merge else None
+    if len(args.name) > 1 or os.path.isdir(args.name[0]):
+        batch(batch_files(args.name), args.template, args.out_file,
+              args.layer_table, args.block_table, args.jobs, args.report,
+              precision=args.precision, drop_duplicates=args.drop_duplicates,
+              lwpolyline=args.lwpolyline, bulk=args.bulk,
+              samples=args.samples, transformation=trans, merge=merge)
+        sys.exit()
     CT = Cp2Templ(args.name[0], args.template, args.out_file,
-                  args.layer_table, args.block_table)
+                  args.layer_table, args.block_table, args.precision,
+                  args.drop_duplicates, args.lwpolyline, args.bulk,
+                  args.samples, args.report, trans, merge, args.jobs)
     CT.copy()
@@ -0,0 +1,488 @@
+#! /usr/bin/env python3
+"""
+    Helper functions to convert entities of DXF drawings created by ezdxf
+"""
+import re
+import math
+import numpy as np
+from ezdxf.lldxf.const import DXF12
+from ezdxf.entities import Polyline
+from ezdxf.math import Matrix44, Vec3, Z_AXIS, TransformError
+
+# POLYLINE flags for curve and spline fit polylines, not converted
+FIT_FLAGS = Polyline.CURVE_FIT_VERTICES_ADDED | Polyline.SPLINE_FIT_VERTICES_ADDED
+
+def polyline2lwpolyline(layout):
+    """ replace 2D POLYLINE entities of a layout by LWPOLYLINE entities,
+        widths and bulges of vertices are kept, curve and spline fit
+        polylines are not converted, the new entities take the place of
+        the polylines in the entity order
+
+        :param layout: modelspace, paperspace or block of a DXF R2000+ drawing
+        :returns: number of converted polylines, 0 for DXF R12 drawings
+    """
+    if layout.doc.dxfversion <= DXF12:
+        return 0    # no LWPOLYLINE in DXF R12
+    replaced = {}   # new entities by id of polylines
+    for entity in layout.query('POLYLINE'):
+        if not entity.is_2d_polyline or entity.dxf.flags & FIT_FLAGS:
+            continue
+        start_width = entity.dxf.default_start_width
+        end_width = entity.dxf.default_end_width
+        pnts = []
+        for vertex in entity.vertices:
+            x, y, _ = vertex.dxf.location
+            pnts.append((x, y, vertex.dxf.get('start_width', start_width),
+                         vertex.dxf.get('end_width', end_width),
+                         vertex.dxf.bulge))
+        if len(pnts) < 2:
+            continue
+        dxfattribs = entity.graphic_properties()
+        dxfattribs['elevation'] = entity.dxf.elevation.z
+        for attr in ('thickness', 'extrusion'):
+            if entity.dxf.hasattr(attr):
+                dxfattribs[attr] = entity.dxf.get(attr)
+        widths = set(p[2] for p in pnts) | set(p[3] for p in pnts)
+        if len(widths) == 1:    # use constant width, no widths per vertex
+            width = widths.pop()
+            if width:
+                dxfattribs['const_width'] = width
+            pnts = [(p[0], p[1], 0, 0, p[4]) for p in pnts]
+        replaced[id(entity)] = layout.add_lwpolyline(
+            pnts, format='xyseb', close=entity.is_closed, dxfattribs=dxfattribs)
+    if replaced:
+        # new entities were appended, move them to the place of the polylines
+        space = layout.entity_space
+        new_ids = {id(e) for e in replaced.values()}
+        order = [replaced.get(id(e), e) for e in space if id(e) not in new_ids]
+        polylines = [e for e in space if id(e) in replaced]
+        space.clear()
+        space.extend(order)
+        for entity in polylines:
+            layout.entitydb.delete_entity(entity)
+    return len(replaced)
+
+MERGE_TOLERANCE = 1e-6  # default tolerance for coincident end points
+# graphic attributes of lines merged with the attributes option
+MERGE_ATTRIBS = ('color', 'linetype', 'lineweight', 'true_color',
+                 'transparency', 'ltscale')
+
+def merge_geometry(entity):
+    """ vertices of an entity to merge
+
+        :param entity: DXF entity
+        :returns: tuple of kind (2D elevation or 3D) and list of vertices,
+                  None if the entity cannot be merged
+    """
+    typ = entity.dxftype()
+    dxf = entity.dxf
+    if dxf.is_supported('extrusion') and \
+       not Vec3(dxf.get('extrusion', Z_AXIS)).isclose(Z_AXIS):
+        return None     # OCS coordinates
+    if dxf.get('thickness', 0):
+        return None
+    if typ == 'LINE':
+        start, end = dxf.start, dxf.end
+        if start.z == end.z:
+            return (start.z, [start.vec2, end.vec2])
+        return (None, [start, end])
+    if typ == 'LWPOLYLINE':
+        if entity.closed or dxf.get('const_width', 0) or \
+           any(s or e or b for _, _, s, e, b in entity.lwpoints):
+            return None     # widths and arcs are not merged
+        return (dxf.elevation, [Vec3(x, y).vec2 for x, y in entity.get_points('xy')])
+    if typ == 'POLYLINE':
+        if entity.is_closed or entity.dxf.flags & FIT_FLAGS:
+            return None
+        if entity.is_3d_polyline:
+            return (None, [v.dxf.location for v in entity.vertices])
+        if not entity.is_2d_polyline or \
+           dxf.get('default_start_width', 0) or dxf.get('default_end_width', 0) or \
+           any(v.dxf.get('start_width', 0) or v.dxf.get('end_width', 0) or
+               v.dxf.bulge for v in entity.vertices):
+            return None
+        return (dxf.elevation.z, [v.dxf.location.vec2 for v in entity.vertices])
+    return None
+
+def merge_lines(layout, entities=None, tolerance=MERGE_TOLERANCE,
+                attributes=False):
+    """ join LINE, LWPOLYLINE and POLYLINE entities with coincident end
+        points into polylines, end points are matched by a hash map of
+        coordinates quantized to the tolerance, lines are joined at nodes
+        where exactly two ends meet only, lines on different layers are not
+        merged, curves, widths and closed polylines are kept
+
+        :param layout: modelspace, paperspace or block
+        :param entities: entities to merge, None all entities of the layout
+        :param tolerance: coordinate tolerance for coincident end points
+        :param attributes: merge lines with the same color, linetype,
+                           lineweight and transparency only
+        :returns: number of merged entities and new polylines
+    """
+    if entities is None:
+        entities = list(layout)
+    groups = {}     # lines by layer, attributes and elevation
+    for entity in entities:
+        if entity.dxftype() not in ('LINE', 'LWPOLYLINE', 'POLYLINE'):
+            continue
+        geom = merge_geometry(entity)
+        if geom is None or len(geom[1]) < 2:
+            continue
+        elevation, pnts = geom
+        key = (entity.dxf.layer, elevation is None,
+               None if elevation is None else round(elevation / tolerance))
+        if attributes:
+            key += tuple(entity.dxf.get(attr) for attr in MERGE_ATTRIBS)
+        groups.setdefault(key, []).append((entity, elevation, pnts))
+    db = layout.doc.entitydb
+    n_merged = n_new = 0
+    for lines in groups.values():
+        if len(lines) < 2:
+            continue
+        # quantized end point to (line index, end) list
+        nodes = {}
+        ends = []
+        for i, (_, _, pnts) in enumerate(lines):
+            end_keys = tuple(tuple(round(c / tolerance) for c in pnts[j])
+                             for j in (0, -1))
+            ends.append(end_keys)
+            for j, node in enumerate(end_keys):
+                nodes.setdefault(node, []).append((i, j))
+        used = [False] * len(lines)
+        for i in range(len(lines)):
+            if used[i]:
+                continue
+            used[i] = True
+            chain = [(i, False)]    # line index and reversed
+            # extend at the end, then at the start of the first line
+            for side in (1, 0):
+                act, rev = chain[-1] if side else chain[0]
+                while True:
+                    node = ends[act][side ^ rev]
+                    incident = nodes[node]
+                    if len(incident) != 2:
+                        break   # end point or junction
+                    nxt, nxt_end = incident[0] if incident[1][0] == act and \
+                        incident[1][1] == side ^ rev else incident[1]
+                    if used[nxt]:
+                        break   # closed loop
+                    used[nxt] = True
+                    # the next line starts (or ends at the start) at the node
+                    nxt_rev = (nxt_end == 1) == bool(side)
+                    if side:
+                        chain.append((nxt, nxt_rev))
+                    else:
+                        chain.insert(0, (nxt, nxt_rev))
+                    act, rev = nxt, nxt_rev
+            if len(chain) < 2:
+                continue
+            pnts = []
+            for index, rev in chain:
+                line_pnts = lines[index][2][::-1] if rev else lines[index][2]
+                pnts += line_pnts[1:] if pnts else line_pnts
+            first, elevation, _ = lines[chain[0][0]]
+            closed = ends[chain[0][0]][chain[0][1]] == \
+                ends[chain[-1][0]][1 - chain[-1][1]] and len(pnts) > 3
+            if closed:
+                pnts = pnts[:-1]
+            dxfattribs = first.graphic_properties()
+            if elevation is None:
+                layout.add_polyline3d(pnts, close=closed, dxfattribs=dxfattribs)
+            elif layout.doc.dxfversion > DXF12:
+                dxfattribs['elevation'] = elevation
+                layout.add_lwpolyline(pnts, format='xy', close=closed,
+                                      dxfattribs=dxfattribs)
+            else:
+                dxfattribs['elevation'] = Vec3(0, 0, elevation)
+                layout.add_polyline2d(pnts, close=closed, dxfattribs=dxfattribs)
+            for index, _ in chain:
+                db.delete_entity(lines[index][0])
+            n_merged += len(chain)
+            n_new += 1
+    if n_merged:
+        layout.purge()  # remove deleted entities from the layout
+    return n_merged, n_new
+
+# entity types transformed in batches by a similarity transformation
+SIMILARITY_ENTITIES = {'POINT', 'LINE', 'LWPOLYLINE', 'POLYLINE', 'SOLID',
+                       'TRACE', 'INSERT', 'ATTRIB', 'TEXT', 'MTEXT', 'ARC',
+                       'CIRCLE'}
+# entity types transformed in batches by an affine transformation,
+# blocks and texts are rotated and scaled uniformly like symbols
+AFFINE_ENTITIES = {'POINT', 'LINE', 'LWPOLYLINE', 'POLYLINE', 'SOLID',
+                   'TRACE', 'INSERT', 'ATTRIB', 'TEXT', 'MTEXT'}
+SOLID_VERTICES = ('vtx0', 'vtx1', 'vtx2', 'vtx3')
+
+class Transformation():
+    """ 2D affine transformation of coordinates, the Helmert (similarity)
+        transformation is a special case, z coordinates are not changed
+
+        x' = a * x + b * y + tx
+        y' = c * x + d * y + ty
+
+        :param matrix: 2x3 array of parameters [[a, b, tx], [c, d, ty]]
+    """
+    def __init__(self, matrix):
+        """ initialize """
+        self.matrix = np.asarray(matrix, dtype=float)
+        (a, b), (c, d) = self.matrix[:, :2]
+        self.det = a * d - b * c
+        self.scale = math.sqrt(abs(self.det))
+        self.rotation = math.degrees(math.atan2(c, a))   # counterclockwise
+        tol = 1e-9 * max(abs(a), abs(b), abs(c), abs(d))
+        self.similarity = abs(a - d) <= tol and abs(b + c) <= tol
+        self.residuals = None   # residuals of control points after fit
+
+    @classmethod
+    def helmert(cls, tx, ty, rotation=0.0, scale=1.0):
+        """ similarity transformation from parameters
+
+            :param tx, ty: translation
+            :param rotation: counterclockwise rotation in degrees
+            :param scale: scale factor
+        """
+        a = scale * math.cos(math.radians(rotation))
+        b = scale * math.sin(math.radians(rotation))
+        return cls([[a, -b, tx], [b, a, ty]])
+
+    @classmethod
+    def fit(cls, src, dst, affine=False):
+        """ least squares fit of a transformation to control points
+
+            :param src: list of source coordinates (x, y)
+            :param dst: list of target coordinates (x, y)
+            :param affine: fit 6 parameter affine transformation, else Helmert
+            :returns: Transformation, residuals are stored in the residuals member
+        """
+        src = np.asarray(src, dtype=float)[:, :2]
+        dst = np.asarray(dst, dtype=float)[:, :2]
+        n = src.shape[0]
+        if n != dst.shape[0] or n < (3 if affine else 2):
+            raise ValueError("Not enough control points")
+        if affine:
+            design = np.column_stack((src, np.ones(n)))
+            params = np.linalg.lstsq(design, dst, rcond=None)[0]
+            trans = cls(params.T)
+        else:
+            x, y = src.T
+            design = np.zeros((2 * n, 4))
+            design[0::2] = np.column_stack((x, -y, np.ones(n), np.zeros(n)))
+            design[1::2] = np.column_stack((y, x, np.zeros(n), np.ones(n)))
+            a, b, tx, ty = np.linalg.lstsq(design, dst.reshape(-1), rcond=None)[0]
+            trans = cls([[a, -b, tx], [b, a, ty]])
+        trans.residuals = dst - trans.apply(src)
+        return trans
+
+    @classmethod
+    def from_file(cls, file_name, affine=False):
+        """ fit transformation to control points from a text file, each line
+            contains source x, y and target x, y separated by space, comma
+            or semicolon
+
+            :param file_name: name of control point file
+            :param affine: fit 6 parameter affine transformation, else Helmert
+            :returns: Transformation or None on error
+        """
+        src = []
+        dst = []
+        try:
+            with open(file_name, "r") as f:
+                for line in f:
+                    lst = [v for v in re.split(r'[\s,;]+', line.strip()) if v]
+                    try:
+                        x, y, x1, y1 = (float(v) for v in lst)
+                    except ValueError:
+                        if lst:
+                            print(f"Control point line skipped:\n{line}")
+                        continue
+                    src.append((x, y))
+                    dst.append((x1, y1))
+        except OSError:
+            print(f"Control point file not loaded: {file_name}")
+            return None
+        try:
+            return cls.fit(src, dst, affine)
+        except ValueError:
+            print(f"Not enough control points in file: {file_name}")
+            return None
+
+    def report(self):
+        """ print parameters and residuals of the transformation """
+        (a, b, tx), (c, d, ty) = self.matrix
+        if self.similarity:
+            print(f"Helmert tx={tx:.4f} ty={ty:.4f} rotation={self.rotation:.8f} scale={self.scale:.10f}")
+        else:
+            print(f"affine a={a:.10f} b={b:.10f} tx={tx:.4f} c={c:.10f} d={d:.10f} ty={ty:.4f}")
+        if self.residuals is not None:
+            dist = np.hypot(self.residuals[:, 0], self.residuals[:, 1])
+            print(f"control points: {len(dist)} RMS={math.sqrt(np.mean(dist ** 2)):.4f} max={np.max(dist):.4f}")
+
+    def apply(self, pnts):
+        """ transform points
+
+            :param pnts: array of points, columns after x, y are not changed
+            :returns: new numpy array of transformed points
+        """
+        pnts = np.array(pnts, dtype=float, ndmin=2)
+        pnts[:, :2] = pnts[:, :2] @ self.matrix[:, :2].T + self.matrix[:, 2]
+        return pnts
+
+    def matrix44(self):
+        """ the transformation as ezdxf matrix """
+        (a, b, tx), (c, d, ty) = self.matrix
+        return Matrix44([a, c, 0, 0, b, d, 0, 0, 0, 0, 1, 0, tx, ty, 0, 1])
+
+    def batched(self, entity):
+        """ check if entity can be transformed in batch
+
+            :param entity: DXF entity
+        """
+        typ = entity.dxftype()
+        if typ not in (SIMILARITY_ENTITIES if self.similarity else AFFINE_ENTITIES):
+            return False
+        if typ == 'POLYLINE' and not (entity.is_2d_polyline or entity.is_3d_polyline):
+            return False    # polyface and polymesh
+        if entity.dxf.is_supported('extrusion') and \
+           not Vec3(entity.dxf.get('extrusion', Z_AXIS)).isclose(Z_AXIS):
+            return False    # OCS coordinates
+        if typ == 'INSERT':
+            return all(self.batched(attrib) for attrib in entity.attribs)
+        return True
+
+    @staticmethod
+    def points(entity):
+        """ coordinates to transform of an entity
+
+            :param entity: DXF entity to transform in batch
+            :returns: list of (x, y, z)
+        """
+        typ = entity.dxftype()
+        dxf = entity.dxf
+        if typ == 'LINE':
+            return [dxf.start, dxf.end]
+        if typ == 'POINT':
+            return [dxf.location]
+        if typ in ('ARC', 'CIRCLE'):
+            return [dxf.center]
+        if typ == 'LWPOLYLINE':
+            return [(p[0], p[1], 0) for p in entity.lwpoints]
+        if typ == 'POLYLINE':
+            return [v.dxf.location for v in entity.vertices]
+        if typ in ('SOLID', 'TRACE'):
+            return [dxf.get(v, Vec3()) for v in SOLID_VERTICES]
+        if typ == 'INSERT':
+            pnts = [dxf.insert]
+            for attrib in entity.attribs:
+                pnts += Transformation.points(attrib)
+            return pnts
+        if typ in ('TEXT', 'ATTRIB'):
+            return [dxf.insert, dxf.get('align_point', dxf.insert)]
+        return [dxf.insert]     # MTEXT
+
+    def update(self, entity, pnts):
+        """ set transformed coordinates and update rotation and sizes
+
+            :param entity: DXF entity to transform in batch
+            :param pnts: transformed points in the order of points()
+            :returns: number of used points
+        """
+        typ = entity.dxftype()
+        dxf = entity.dxf
+        scale = self.scale
+        if typ == 'LINE':
+            dxf.start, dxf.end = Vec3(pnts[0]), Vec3(pnts[1])
+            return 2
+        if typ == 'POINT':
+            dxf.location = Vec3(pnts[0])
+            return 1
+        if typ in ('ARC', 'CIRCLE'):
+            dxf.center = Vec3(pnts[0])
+            dxf.radius *= scale
+            if typ == 'ARC':
+                dxf.start_angle = (dxf.start_angle + self.rotation) % 360
+                dxf.end_angle = (dxf.end_angle + self.rotation) % 360
+            return 1
+        if typ == 'LWPOLYLINE':
+            sign = 1 if self.det > 0 else -1
+            n = len(entity)
+            entity.set_points([(x, y, s * scale, e * scale, b * sign)
+                               for (x, y), (_, _, s, e, b) in
+                               zip(pnts[:n, :2].tolist(), entity.lwpoints)],
+                              format='xyseb')
+            if dxf.hasattr('const_width'):
+                dxf.const_width *= scale
+            return n
+        if typ == 'POLYLINE':
+            sign = 1 if self.det > 0 else -1
+            for attr in ('default_start_width', 'default_end_width'):
+                if dxf.hasattr(attr):
+                    dxf.set(attr, dxf.get(attr) * scale)
+            for vertex, pnt in zip(entity.vertices, pnts.tolist()):
+                vertex.dxf.location = Vec3(pnt)
+                for attr in ('start_width', 'end_width'):
+                    if vertex.dxf.hasattr(attr):
+                        vertex.dxf.set(attr, vertex.dxf.get(attr) * scale)
+                if vertex.dxf.hasattr('bulge'):
+                    vertex.dxf.bulge *= sign
+            return len(entity.vertices)
+        if typ in ('SOLID', 'TRACE'):
+            for attr, pnt in zip(SOLID_VERTICES, pnts.tolist()):
+                dxf.set(attr, Vec3(pnt))
+            return 4
+        if typ == 'INSERT':
+            dxf.insert = Vec3(pnts[0])
+            dxf.xscale *= scale
+            dxf.yscale *= scale
+            dxf.rotation = (dxf.rotation + self.rotation) % 360
+            n = 1
+            for attrib in entity.attribs:
+                n += self.update(attrib, pnts[n:])
+            return n
+        if typ in ('TEXT', 'ATTRIB'):
+            dxf.insert = Vec3(pnts[0])
+            if dxf.hasattr('align_point'):
+                dxf.align_point = Vec3(pnts[1])
+            dxf.height *= scale
+            dxf.rotation = (dxf.rotation + self.rotation) % 360
+            return 2
+        # MTEXT
+        dxf.insert = Vec3(pnts[0])
+        dxf.char_height *= scale
+        if dxf.hasattr('width'):
+            dxf.width *= scale
+        if dxf.hasattr('text_direction'):
+            direction = self.matrix[:, :2] @ Vec3(dxf.text_direction).vec2
+            dxf.text_direction = Vec3(direction[0], direction[1], 0).normalize()
+        else:
+            dxf.rotation = (dxf.get('rotation', 0) + self.rotation) % 360
+        return 1
+
+    def transform_entities(self, entities):
+        """ transform entities, coordinates of simple entities are collected
+            and transformed in one numpy operation, other entities are
+            transformed by ezdxf one by one
+
+            :param entities: list of DXF entities
+            :returns: number of transformed and not transformable entities
+        """
+        batch = []
+        pnts = []
+        n_failed = 0
+        m44 = None
+        for entity in entities:
+            if self.batched(entity):
+                batch.append(entity)
+                pnts += self.points(entity)
+                continue
+            if m44 is None:
+                m44 = self.matrix44()
+            try:
+                entity.transform(m44)
+            except (NotImplementedError, TransformError):
+                n_failed += 1
+        if batch:
+            pnts = self.apply([tuple(p) for p in pnts])
+            i = 0
+            for entity in batch:
+                i += self.update(entity, pnts[i:])
+        return len(entities) - n_failed, n_failed
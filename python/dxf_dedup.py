@@ -0,0 +1,201 @@
+#! /usr/bin/env python3
+"""
+    Remove duplicated LINE, POINT, TEXT and INSERT entities from the
+    modelspace of a DXF file, entities are duplicates if their geometry
+    (quantized to the tolerance) and their layer, color, linetype,
+    lineweight and type specific attributes are the same,
+    LINE entities are compared independently of their direction,
+    optionally overlapping collinear LINE entities are merged into one
+
+    python dxf_dedup.py input.dxf
+    python dxf_dedup.py --tolerance 0.01 --overlap --target out.dxf input.dxf
+"""
+import sys
+import os.path
+import argparse
+from math import atan2, pi
+from collections import Counter
+import ezdxf
+from dxf_writer import save_dxf
+
+DEDUP_ENTITIES = ('LINE', 'POINT', 'TEXT', 'INSERT')
+ANGLE_TOL = 1e-6    # tolerance for direction of collinear lines (radians)
+
+class DxfDedup():
+    """ class to remove duplicated entities from a DXF drawing
+
+        :param dxf_file: DXF file to process
+        :param out_file: output DXF file
+        :param tolerance: coordinate tolerance for identical geometry
+        :param overlap: merge overlapping collinear lines
+        :param precision: number of decimals for coordinates in output, None no rounding
+    """
+    def __init__(self, dxf_file, out_file, tolerance=0.001, overlap=False,
+                 precision=None):
+        """ initialize """
+        self.dxf_file = dxf_file
+        self.out_file = out_file
+        self.tolerance = tolerance
+        self.overlap = overlap
+        self.precision = precision
+        try:
+            self.doc = ezdxf.readfile(dxf_file)
+        except IOError:
+            print(f"*** ERROR Not a DXF file or a generic I/O error: {dxf_file}")
+            sys.exit()
+        except ezdxf.DXFStructureError:
+            print(f"*** ERROR Invalid or corrupted DXF file: {dxf_file}")
+            sys.exit()
+        self.n_duplicates = Counter()   # removed duplicates by layer
+        self.n_overlaps = Counter()     # merged overlapping lines by layer
+
+    def quantize(self, pnt):
+        """ quantize coordinates to the tolerance
+
+            :param pnt: point coordinates
+            :returns: tuple of integers
+        """
+        return tuple(round(c / self.tolerance) for c in pnt)
+
+    def key(self, entity):
+        """ normalized geometry key of an entity
+
+            :param entity: LINE, POINT, TEXT or INSERT entity
+            :returns: hashable key, entities with equal key are duplicates
+        """
+        dxf = entity.dxf
+        typ = entity.dxftype()
+        attr_key = (typ, dxf.layer, dxf.color, dxf.linetype, dxf.lineweight,
+                    dxf.get('true_color'))
+        if typ == 'LINE':
+            start = self.quantize(dxf.start)
+            end = self.quantize(dxf.end)
+            return attr_key + (min(start, end), max(start, end))
+        if typ == 'POINT':
+            return attr_key + (self.quantize(dxf.location), )
+        if typ == 'TEXT':
+            return attr_key + (self.quantize(dxf.insert),
+                               self.quantize(dxf.align_point) if dxf.hasattr('align_point') else None,
+                               dxf.text, dxf.style, dxf.halign, dxf.valign,
+                               round(dxf.height / self.tolerance),
+                               round(dxf.rotation % 360, 6), round(dxf.width, 6))
+        # INSERT
+        return attr_key + (self.quantize(dxf.insert), dxf.name,
+                           round(dxf.xscale, 6), round(dxf.yscale, 6),
+                           round(dxf.zscale, 6), round(dxf.rotation % 360, 6),
+                           tuple((a.dxf.tag, a.dxf.text) for a in entity.attribs))
+
+    def remove_duplicates(self, msp):
+        """ remove duplicates using a hash map in one pass
+
+            :param msp: modelspace to process
+        """
+        seen = set()
+        db = self.doc.entitydb
+        for entity in msp.query(' '.join(DEDUP_ENTITIES)):
+            key = self.key(entity)
+            if key in seen:
+                self.n_duplicates[entity.dxf.layer] += 1
+                db.delete_entity(entity)
+            else:
+                seen.add(key)
+
+    def merge_overlaps(self, msp):
+        """ merge overlapping collinear lines, lines on the same infinite line
+            are sorted along the line and swept to find overlaps
+
+            :param msp: modelspace to process
+        """
+        groups = {}
+        for line in msp.query('LINE'):
+            start = line.dxf.start
+            end = line.dxf.end
+            if self.quantize((start.z, )) != self.quantize((end.z, )):
+                continue    # only horizontal lines
+            direction = end - start
+            if direction.magnitude < self.tolerance:
+                continue
+            angle = atan2(direction.y, direction.x) % pi
+            unit = ezdxf.math.Vec3.from_angle(angle)
+            offset = unit.x * start.y - unit.y * start.x  # distance from origin
+            dxf = line.dxf
+            key = (dxf.layer, dxf.color, dxf.linetype, dxf.lineweight,
+                   dxf.get('true_color'), round(angle / ANGLE_TOL),
+                   round(offset / self.tolerance), self.quantize((start.z, )))
+            t_start = unit.dot(start)
+            t_end = unit.dot(end)
+            if t_start < t_end:
+                groups.setdefault(key, []).append((t_start, t_end, end, line))
+            else:
+                groups.setdefault(key, []).append((t_end, t_start, start, line))
+        db = self.doc.entitydb
+        for lines in groups.values():
+            if len(lines) < 2:
+                continue
+            lines.sort(key=lambda x: x[0])
+            _, t_end, _, act = lines[0]
+            new_end = None  # new far end point of act
+            for t_start1, t_end1, end1, line in lines[1:]:
+                if t_start1 < t_end - self.tolerance:   # overlap
+                    if t_end1 > t_end:
+                        t_end, new_end = t_end1, end1
+                    self.n_overlaps[line.dxf.layer] += 1
+                    db.delete_entity(line)
+                else:
+                    self.extend(act, new_end)
+                    t_end, new_end, act = t_end1, None, line
+            self.extend(act, new_end)
+
+    @staticmethod
+    def extend(line, pnt):
+        """ move the end point of a line nearer to pnt into pnt
+
+            :param line: LINE entity
+            :param pnt: new end point, None for no change
+        """
+        if pnt is not None:
+            if line.dxf.end.distance(pnt) < line.dxf.start.distance(pnt):
+                line.dxf.end = pnt
+            else:
+                line.dxf.start = pnt
+
+    def report(self):
+        """ print number of removed entities by layer """
+        layers = sorted(set(self.n_duplicates) | set(self.n_overlaps))
+        if len(layers) == 0:
+            print("No duplicates found")
+            return
+        print(f"{'layer':32s} {'duplicates':>10s} {'overlaps':>10s}")
+        for layer in layers:
+            print(f"{layer:32s} {self.n_duplicates[layer]:10d} {self.n_overlaps[layer]:10d}")
+        print(f"{'total':32s} {sum(self.n_duplicates.values()):10d} {sum(self.n_overlaps.values()):10d}")
+
+    def dedup(self):
+        """ remove duplicates and save output """
+        msp = self.doc.modelspace()
+        self.remove_duplicates(msp)
+        if self.overlap:
+            self.merge_overlaps(msp)
+        msp.purge()     # remove deleted entities from modelspace
+        self.report()
+        save_dxf(self.doc, self.out_file, self.precision)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('name', metavar='file_name', type=str, nargs=1,
+                        help='DXF file to process')
+    parser.add_argument('-t', '--target', default=None,
+                        help='Target DXF file')
+    parser.add_argument('-l', '--tolerance', type=float, default=0.001,
+                        help='Coordinate tolerance, default 0.001')
+    parser.add_argument('-o', '--overlap', action="store_true",
+                        help='Merge overlapping collinear lines')
+    parser.add_argument('-p', '--precision', type=int, default=None,
+                        help='Number of decimals for coordinates in output')
+    args = parser.parse_args()
+
+    if args.target is None:
+        args.target = os.path.splitext(args.name[0])[0] + '_dedup.dxf'
+    DD = DxfDedup(args.name[0], args.target, args.tolerance, args.overlap,
+                  args.precision)
+    DD.dedup()
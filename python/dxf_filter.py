@@ -7,14 +7,18 @@
 
     python dxf_filter.py --layers 0 1 --entities LINE TEXT -- input.dxf
     python dxf_filter.py --layers 0 1 --entities LINE TEXT --target out.dxf input.dxf
+    python dxf_filter.py --layers 0 1 --precision 3 --drop_duplicates -- input.dxf
+    python dxf_filter.py --dxf_version R2000 --lwpolyline input.dxf
 
-    TODO LWPOLYLINE not in target
+    LWPOLYLINE is not in target for the default AC1009 (R12) output version
 """
 import sys
 import os.path
 import argparse
 import ezdxf
 from ezdxf.addons import Importer
+from dxf_writer import save_dxf, drop_duplicate_vertices
+from dxf_convert import polyline2lwpolyline
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -26,6 +30,16 @@ if __name__ == "__main__":
                         help='Entities to copy tartget')
     parser.add_argument('-t', '--target', default=None,
                         help='Target DXF file')
+    parser.add_argument('--dxf_version', type=str, default='AC1009',
+                        help='DXF version of target (e.g. AC1009, R2000, AC1032), default AC1009')
+    parser.add_argument('-w', '--lwpolyline', action="store_true",
+                        help='Convert 2D POLYLINE to LWPOLYLINE, DXF R2000+ target')
+    parser.add_argument('-p', '--precision', type=int, default=None,
+                        help='Number of decimals for coordinates in output')
+    parser.add_argument('-d', '--drop_duplicates', action="store_true",
+                        help='Drop consecutive polyline vertices identical after rounding')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes to write output, default 1')
     args = parser.parse_args()
 
     if args.target is None:
@@ -43,8 +57,11 @@ if __name__ == "__main__":
         print(f"Invalid or corrupted DXF file: {args.names[0]}")
         sys.exit(2)
 
-#    tdoc = ezdxf.new()
-    tdoc = ezdxf.new('AC1009')
+    try:
+        tdoc = ezdxf.new(args.dxf_version)
+    except ezdxf.DXFVersionError:
+        print(f"Invalid DXF version: {args.dxf_version}")
+        sys.exit(3)
     importer = Importer(sdoc, tdoc)
 
     # import tables from source
@@ -64,4 +81,12 @@ if __name__ == "__main__":
             importer.import_entity(entity, tmsp)
 
     importer.finalize()
-    tdoc.saveas(args.target)
+    if args.lwpolyline:
+        if tdoc.dxfversion > 'AC1009':
+            for block in tdoc.blocks:
+                polyline2lwpolyline(block)
+        else:
+            print("LWPOLYLINE is not supported by DXF R12, POLYLINE not converted")
+    if args.precision is not None and args.drop_duplicates:
+        drop_duplicate_vertices(tdoc, args.precision)
+    save_dxf(tdoc, args.target, args.precision, args.jobs)
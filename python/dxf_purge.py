@@ -0,0 +1,218 @@
+#! /usr/bin/env python3
+"""
+    Purge unused block definitions, layers, linetypes, text and dimension
+    styles from a DXF file, the references are collected from all layouts
+    and the content of the referenced blocks in one traversal, the
+    unreachable definitions are deleted from the drawing, other data
+    (header, objects, layouts) is kept unchanged
+
+    python dxf_purge.py input.dxf
+    python dxf_purge.py --target out.dxf input.dxf
+"""
+import sys
+import os.path
+import argparse
+import time
+import ezdxf
+from ezdxf.lldxf.tagwriter import TagCollector
+from ezdxf.sections.blocks import is_special_block
+from dxf_writer import save_dxf
+
+TABLES = ('layers', 'linetypes', 'styles', 'dimstyles')
+# table entries required by AutoCAD, never deleted
+RESERVED = {'layers': ('0', 'Defpoints'),
+            'linetypes': ('ByBlock', 'ByLayer', 'Continuous'),
+            'styles': ('Standard', ), 'dimstyles': ('Standard', )}
+# header variables referencing table entries
+HEADER_REFS = {'$CLAYER': 'layers', '$CELTYPE': 'linetypes',
+               '$TEXTSTYLE': 'styles', '$DIMSTYLE': 'dimstyles',
+               '$DIMTXSTY': 'styles'}
+# dimension style attributes referencing linetypes and arrow blocks
+DIMSTYLE_LTYPES = ('dimltype', 'dimltex1', 'dimltex2')
+DIMSTYLE_BLOCKS = ('dimblk', 'dimblk1', 'dimblk2', 'dimldrblk')
+# group codes of handles referencing other objects (soft/hard pointers)
+POINTER_CODES = range(340, 370)
+
+class DxfPurge():
+    """ class to remove unused definitions from a DXF drawing
+
+        :param dxf_file: DXF file to purge
+        :param out_file: compacted output DXF file
+        :param precision: number of decimals for coordinates in output, None no rounding
+    """
+    def __init__(self, dxf_file, out_file, precision=None):
+        """ initialize """
+        self.dxf_file = dxf_file
+        self.out_file = out_file
+        self.precision = precision
+        start = time.perf_counter()
+        try:
+            self.doc = ezdxf.readfile(dxf_file)
+        except IOError:
+            print(f"*** ERROR Not a DXF file or a generic I/O error: {dxf_file}")
+            sys.exit()
+        except ezdxf.DXFStructureError:
+            print(f"*** ERROR Invalid or corrupted DXF file: {dxf_file}")
+            sys.exit()
+        self.load_time = time.perf_counter() - start
+        self.used = {name: set() for name in TABLES + ('blocks', )}
+
+    def add_entity(self, entity, blocks):
+        """ collect the definitions referenced by an entity
+
+            :param entity: DXF entity
+            :param blocks: list of block names to visit
+        """
+        used = self.used
+        dxf = entity.dxf
+        used['layers'].add(dxf.get('layer', '0'))
+        used['linetypes'].add(dxf.get('linetype', 'BYLAYER'))
+        if dxf.is_supported('style'):
+            used['styles'].add(dxf.get('style', 'Standard'))
+        if dxf.is_supported('dimstyle'):
+            used['dimstyles'].add(dxf.get('dimstyle', 'Standard'))
+        typ = entity.dxftype()
+        if typ == 'INSERT':
+            blocks.append(dxf.name)
+            for attrib in entity.attribs:
+                self.add_entity(attrib, blocks)
+        elif typ in ('DIMENSION', 'ARC_DIMENSION') and dxf.hasattr('geometry'):
+            blocks.append(dxf.geometry)
+
+    def visit_blocks(self, blocks):
+        """ collect the definitions referenced by the content of blocks,
+            every block definition is visited once
+
+            :param blocks: list of block names to visit
+        """
+        used = self.used
+        while blocks:
+            name = blocks.pop()
+            if name in used['blocks'] or name not in self.doc.blocks:
+                continue
+            used['blocks'].add(name)
+            for entity in self.doc.blocks[name]:
+                self.add_entity(entity, blocks)
+
+    def add_handles(self, handles, blocks):
+        """ collect the definitions referenced by handles
+
+            :param handles: set of handles
+            :param blocks: list of block names to visit
+        """
+        for table in TABLES:
+            for entry in getattr(self.doc, table):
+                if entry.dxf.handle in handles:
+                    self.used[table].add(entry.dxf.name)
+        for record in self.doc.block_records:
+            if record.dxf.handle in handles:
+                blocks.append(record.dxf.name)
+
+    def object_handles(self):
+        """ handles referenced by the objects of the OBJECTS section
+            (e.g. text styles and blocks of MLEADERSTYLE and TABLESTYLE)
+
+            :returns: set of handles
+        """
+        collector = TagCollector(dxfversion=self.doc.dxfversion)
+        for obj in self.doc.objects:
+            obj.export_dxf(collector)
+        return {tag.value for tag in collector.tags if tag.code in POINTER_CODES}
+
+    def references(self):
+        """ collect reachable definitions from all layouts and blocks """
+        used = self.used
+        for table, names in RESERVED.items():
+            used[table].update(names)
+        for var, table in HEADER_REFS.items():
+            if var in self.doc.header:
+                used[table].add(self.doc.header[var])
+        blocks = []     # block names to visit
+        self.add_handles(self.object_handles(), blocks)
+        for layout in self.doc.layouts:
+            for entity in layout:
+                self.add_entity(entity, blocks)
+        self.visit_blocks(blocks)
+        # dimension styles reference text styles, linetypes and arrow blocks
+        for name in used['dimstyles']:
+            if name in self.doc.dimstyles:
+                dimstyle = self.doc.dimstyles.get(name)
+                used['styles'].add(dimstyle.dxf.get('dimtxsty', 'Standard'))
+                for attr in DIMSTYLE_LTYPES:
+                    used['linetypes'].add(dimstyle.dxf.get(attr, 'BYLAYER'))
+                for attr in DIMSTYLE_BLOCKS:
+                    if dimstyle.dxf.get(attr, ''):
+                        blocks.append(dimstyle.dxf.get(attr))
+        self.visit_blocks(blocks)
+        # layers reference linetypes
+        for name in used['layers']:
+            if name in self.doc.layers:
+                used['linetypes'].add(self.doc.layers.get(name).dxf.linetype)
+        # complex linetypes reference text styles of their text and shapes
+        handles = set()
+        for name in used['linetypes']:
+            if name in self.doc.linetypes:
+                handles.update(tag.value for tag in
+                               self.doc.linetypes.get(name).pattern_tags.tags
+                               if tag.code == 340)
+        self.add_handles(handles, [])
+
+    def counts(self):
+        """ number of definitions in the drawing
+
+            :returns: dictionary of table name and number of entries
+        """
+        res = {table: len(getattr(self.doc, table)) for table in TABLES}
+        res['blocks'] = len([b for b in self.doc.blocks if not b.is_any_layout])
+        return res
+
+    def purge(self):
+        """ delete unreachable definitions from the drawing """
+        self.references()
+        before = self.counts()
+        for table in TABLES:
+            used = {name.lower() for name in self.used[table]}
+            entries = getattr(self.doc, table)
+            for name in [e.dxf.name for e in entries if e.dxf.name.lower() not in used]:
+                entries.remove(name)
+        used = {name.lower() for name in self.used['blocks']}
+        for name in [b.name for b in self.doc.blocks
+                     if not b.is_any_layout and b.name.lower() not in used and
+                     not is_special_block(b.name)]:
+            self.doc.blocks.delete_block(name, safe=False)
+        self.doc.entitydb.purge()   # drop deleted entities
+        save_dxf(self.doc, self.out_file, self.precision)
+        start = time.perf_counter()
+        ezdxf.readfile(self.out_file)
+        self.report(before, time.perf_counter() - start)
+
+    def report(self, before, load_time):
+        """ print statistics of the purge
+
+            :param before: number of definitions before purge, see counts
+            :param load_time: load time of compacted drawing
+        """
+        after = self.counts()
+        print(f"{'definitions':12s} {'before':>10s} {'after':>10s} {'removed':>10s}")
+        for table in TABLES + ('blocks', ):
+            print(f"{table:12s} {before[table]:10d} {after[table]:10d} "
+                  f"{before[table] - after[table]:10d}")
+        size = os.path.getsize(self.dxf_file)
+        new_size = os.path.getsize(self.out_file)
+        print(f"file size {size} -> {new_size} bytes ({100 * new_size / size:.1f}%)")
+        print(f"load time {self.load_time:.3f} -> {load_time:.3f} s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('name', metavar='file_name', type=str, nargs=1,
+                        help='DXF file to purge')
+    parser.add_argument('-t', '--target', default=None,
+                        help='Target DXF file')
+    parser.add_argument('-p', '--precision', type=int, default=None,
+                        help='Number of decimals for coordinates in output')
+    args = parser.parse_args()
+
+    if args.target is None:
+        args.target = os.path.splitext(args.name[0])[0] + '_purged.dxf'
+    DP = DxfPurge(args.name[0], args.target, args.precision)
+    DP.purge()
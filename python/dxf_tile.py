@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+"""
+    Cut a DXF file into a grid of DXF files (tiles),
+    the bounding boxes of modelspace entities are calculated once and the
+    entities are binned into grid cells by bounding box overlap,
+    one DXF file is written for each non-empty tile, only the layers,
+    linetypes, styles and blocks used by the entities of the tile are copied,
+    tile files are named <target>_<column>_<row>.dxf
+
+    python dxf_tile.py --size 1000 input.dxf
+    python dxf_tile.py --size 1000 500 --margin 10 --jobs 4 --target tiles/map input.dxf
+"""
+import sys
+import os.path
+import argparse
+from math import floor
+from multiprocessing import Pool
+import ezdxf
+from ezdxf import bbox
+from ezdxf.addons import Importer
+
+SDOC = None     # source drawing, shared with the worker processes
+
+def init_worker(dxf_file):
+    """ load source drawing in a worker process if not inherited from parent
+
+        :param dxf_file: source DXF file
+    """
+    global SDOC
+    if SDOC is None:    # spawned worker, nothing inherited
+        SDOC = ezdxf.readfile(dxf_file)
+
+def write_tile(job):
+    """ write one tile to DXF, used by worker processes
+
+        :param job: tuple of output file name and list of entity handles
+        :returns: output file name and number of entities
+    """
+    out_file, handles = job
+    tdoc = ezdxf.new(SDOC.dxfversion)
+    importer = Importer(SDOC, tdoc)
+    tmsp = tdoc.modelspace()
+    for handle in handles:
+        importer.import_entity(SDOC.entitydb[handle], tmsp)
+    importer.finalize()     # import used tables and blocks only
+    tdoc.saveas(out_file)
+    return out_file, len(handles)
+
+class DxfTile():
+    """ class to cut a DXF drawing into tiles
+
+        :param dxf_file: DXF file to cut into tiles
+        :param target: path and prefix for tile file names
+        :param width: width of tiles
+        :param height: height of tiles
+        :param origin: origin of tile grid (x, y)
+        :param margin: overlap margin around tiles
+        :param jobs: number of parallel worker processes
+        :param verbose: verbose output to stdout
+    """
+    def __init__(self, dxf_file, target, width, height, origin=(0.0, 0.0),
+                 margin=0.0, jobs=1, verbose=False):
+        """ initialize """
+        self.dxf_file = dxf_file
+        self.target = target
+        self.width = width
+        self.height = height
+        self.origin = origin
+        self.margin = margin
+        self.jobs = jobs
+        self.verbose = verbose
+        try:
+            self.doc = ezdxf.readfile(dxf_file)
+        except IOError:
+            print(f"*** ERROR Not a DXF file or a generic I/O error: {dxf_file}")
+            sys.exit()
+        except ezdxf.DXFStructureError:
+            print(f"*** ERROR Invalid or corrupted DXF file: {dxf_file}")
+            sys.exit()
+
+    def bins(self):
+        """ collect entity handles for grid cells, the bounding box of each
+            entity is calculated once
+
+            :returns: dictionary of (column, row): list of handles and the
+                      number of entities without extents
+        """
+        cells = {}
+        n_skipped = 0
+        x0, y0 = self.origin
+        cache = bbox.Cache()
+        for entity in self.doc.modelspace():
+            box = bbox.extents([entity], fast=True, cache=cache)
+            if not box.has_data:
+                n_skipped += 1
+                continue
+            col1 = floor((box.extmin.x - self.margin - x0) / self.width)
+            col2 = floor((box.extmax.x + self.margin - x0) / self.width)
+            row1 = floor((box.extmin.y - self.margin - y0) / self.height)
+            row2 = floor((box.extmax.y + self.margin - y0) / self.height)
+            handle = entity.dxf.handle
+            for col in range(col1, col2 + 1):
+                for row in range(row1, row2 + 1):
+                    cells.setdefault((col, row), []).append(handle)
+        return cells, n_skipped
+
+    def tile(self):
+        """ write non-empty tiles to DXF files """
+        global SDOC
+        cells, n_skipped = self.bins()
+        if n_skipped > 0:
+            print(f"{n_skipped} entities without extents skipped")
+        jobs = [(f"{self.target}_{col}_{row}.dxf", handles)
+                for (col, row), handles in sorted(cells.items())]
+        SDOC = self.doc     # inherited by forked workers, no reparse
+        if self.jobs > 1:
+            with Pool(self.jobs, initializer=init_worker,
+                      initargs=(self.dxf_file,)) as pool:
+                results = list(pool.imap_unordered(write_tile, jobs))
+        else:
+            results = [write_tile(job) for job in jobs]
+        if self.verbose:
+            for out_file, n in sorted(results):
+                print(f"{out_file}: {n} entities")
+        print(f"{len(results)} tiles written")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('name', metavar='file_name', type=str, nargs=1,
+                        help='DXF file to process')
+    parser.add_argument('-s', '--size', type=float, nargs='+', required=True,
+                        help='Tile width and optionally height')
+    parser.add_argument('-r', '--origin', type=float, nargs=2, default=[0.0, 0.0],
+                        help='Origin of tile grid, default 0 0')
+    parser.add_argument('-m', '--margin', type=float, default=0.0,
+                        help='Overlap margin around tiles, default 0')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of parallel processes writing tiles, default 1')
+    parser.add_argument('-t', '--target', default=None,
+                        help='Path and prefix for tile file names')
+    parser.add_argument('-v', '--verbose', action="store_true",
+                        help='verbose output to stdout')
+    args = parser.parse_args()
+
+    if args.target is None:
+        args.target = os.path.splitext(args.name[0])[0]
+    if len(args.size) > 2 or min(args.size) <= 0:
+        raise argparse.ArgumentTypeError("Tile size must be one or two positive values")
+    if len(args.size) == 1:
+        args.size.append(args.size[0])
+    DT = DxfTile(args.name[0], args.target, args.size[0], args.size[1],
+                 args.origin, args.margin, args.jobs, args.verbose)
+    DT.tile()
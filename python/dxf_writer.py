@@ -0,0 +1,405 @@
+#! /usr/bin/env python3
+"""
+    Helper functions to write DXF files created by ezdxf,
+    coordinates and lengths of entities can be rounded at write time
+    to the given number of decimals to reduce file size,
+    large number of entities can be streamed to the output file
+    without keeping them in the drawing, the entities of large drawings
+    can be serialized in parallel processes
+"""
+import os
+import tempfile
+import multiprocessing
+from io import StringIO
+from ezdxf.lldxf.const import DXF12, DXFVersionError
+from ezdxf.lldxf.tagwriter import TagWriter
+from ezdxf.lldxf.types import DXFVertex
+from ezdxf.entities import Point, Insert, LWPolyline, Polyline
+
+# group codes of coordinates, elevation, thickness and lengths to round
+ROUND_CODES = frozenset(range(10, 41))
+# group codes of direction vectors, ratios and parameters in the range of
+# ROUND_CODES by entity type, they are written unchanged
+NO_ROUND_CODES = {
+    'ELLIPSE': frozenset([40]),                         # axis ratio
+    'MTEXT': frozenset([11, 21, 31]),                   # text direction
+    'SPLINE': frozenset([12, 22, 32, 13, 23, 33, 40]),  # tangents, knots
+    'HATCH': frozenset([12, 22, 13, 23, 40]),   # edge tangents, knots, ratio
+    'MPOLYGON': frozenset([12, 22, 13, 23, 40]),
+    'IMAGE': frozenset([11, 21, 31, 12, 22, 32]),       # pixel u, v vectors
+    'WIPEOUT': frozenset([11, 21, 31, 12, 22, 32]),
+    'MLINE': frozenset([12, 22, 32, 13, 23, 33]),       # directions
+    'XLINE': frozenset([11, 21, 31]),                   # unit direction
+    'RAY': frozenset([11, 21, 31]),
+    'TOLERANCE': frozenset([11, 21, 31]),               # x axis direction
+    'VIEWPORT': frozenset([16, 26, 36]),                # view direction
+}
+NO_ROUND = frozenset()
+COPY_CHUNK = 1 << 20    # characters copied at once from streamed entities
+EXPORT_CHUNK = 20000    # minimal number of entities serialized by a process
+# smaller modelspaces are written serially, starting processes costs more
+PARALLEL_EXPORT_MIN = 100000
+# entities and tag writer parameters inherited by forked export processes
+EXPORT = {}
+
+class PrecisionTagWriter(TagWriter):
+    """ ASCII DXF tag writer rounding coordinates and lengths
+
+        :param stream: text stream to write to
+        :param dxfversion: DXF version of output
+        :param write_handles: write handles of entities
+        :param precision: number of decimals to keep
+    """
+    def __init__(self, stream, dxfversion, write_handles, precision):
+        """ initialize """
+        super().__init__(stream, dxfversion, write_handles)
+        self.precision = precision
+        self.no_round = NO_ROUND    # codes not rounded in current entity
+
+    def write_tag(self, tag):
+        """ write a tag, vertices are split to coordinates """
+        if tag.code == 0:   # start of an entity
+            self.no_round = NO_ROUND_CODES.get(tag.value, NO_ROUND)
+        if tag.code in ROUND_CODES and tag.code not in self.no_round:
+            if isinstance(tag, DXFVertex):
+                self.write_vertex(tag.code, tag.value)
+            else:
+                self.write_tag2(tag.code, tag.value)
+        else:
+            super().write_tag(tag)
+
+    def write_tag2(self, code, value):
+        """ write a tag given by group code and value """
+        if code == 0:   # start of an entity
+            self.no_round = NO_ROUND_CODES.get(value, NO_ROUND)
+        elif code in ROUND_CODES and isinstance(value, float) and \
+             code not in self.no_round:
+            value = round(value, self.precision) + 0.0  # no -0.0
+        super().write_tag2(code, value)
+
+    def write_vertex(self, code, vertex):
+        """ write coordinates of a vertex """
+        for index, value in enumerate(vertex):
+            self.write_tag2(code + index * 10, value)
+
+def export_chunk(chunk):
+    """ serialize a range of modelspace entities in an export process
+
+        :param chunk: tuple of start and end index of entities
+        :returns: DXF tags of the entities as string
+    """
+    stream = StringIO()
+    if EXPORT['precision'] is None:
+        tagwriter = TagWriter(stream, EXPORT['dxfversion'], EXPORT['handles'])
+    else:
+        tagwriter = PrecisionTagWriter(stream, EXPORT['dxfversion'],
+                                       EXPORT['handles'], EXPORT['precision'])
+    for entity in EXPORT['entities'][chunk[0]:chunk[1]]:
+        entity.export_dxf(tagwriter)
+    return stream.getvalue()
+
+def export_entities(doc, entity_writer, jobs, precision=None):
+    """ export modelspace entities by parallel processes, the processes are
+        forked after the handles are assigned and inherit the drawing, each
+        serializes a range of entities to a string, the strings are written
+        in the original order
+
+        :param doc: ezdxf drawing to export, handles are up to date
+        :param entity_writer: tag writer of the output
+        :param jobs: number of processes
+        :param precision: number of decimals for coordinates, None no rounding
+    """
+    entities = list(doc.modelspace().entity_space)
+    size = max(EXPORT_CHUNK, -(-len(entities) // (4 * jobs)))
+    chunks = [(i, i + size) for i in range(0, len(entities), size)]
+    EXPORT.update(entities=entities, dxfversion=entity_writer.dxfversion,
+                  handles=entity_writer.write_handles, precision=precision)
+    try:
+        with multiprocessing.get_context('fork').Pool(min(jobs, len(chunks))) as pool:
+            for text in pool.imap(export_chunk, chunks):
+                entity_writer.write_str(text)
+    finally:
+        EXPORT.clear()
+
+def parallel_export(doc, jobs):
+    """ check if the modelspace entities are serialized by parallel processes
+
+        :param doc: ezdxf drawing to export
+        :param jobs: number of processes
+        :returns: True for large drawings if more jobs are given and processes
+                  can be forked
+    """
+    # pool workers (daemons) cannot start processes
+    return jobs > 1 and len(doc.modelspace()) >= PARALLEL_EXPORT_MIN and \
+        'fork' in multiprocessing.get_all_start_methods() and \
+        not multiprocessing.current_process().daemon
+
+def export_sections(doc, tagwriter, entity_writer=None, stream_file=None,
+                    jobs=1, precision=None):
+    """ export the sections of a drawing, the same order as ezdxf uses
+
+        :param doc: ezdxf drawing to export
+        :param tagwriter: tag writer for all sections
+        :param entity_writer: tag writer for BLOCKS and ENTITIES sections
+        :param stream_file: text file of streamed entities appended to ENTITIES section
+        :param jobs: number of processes to serialize modelspace entities
+        :param precision: number of decimals of entity_writer for the processes
+    """
+    if entity_writer is None:
+        entity_writer = tagwriter
+    doc.header.export_dxf(tagwriter)
+    if tagwriter.dxfversion > DXF12:
+        doc.classes.export_dxf(tagwriter)
+    doc.tables.export_dxf(tagwriter)
+    doc.blocks.export_dxf(entity_writer)
+    if stream_file is None and parallel_export(doc, jobs):
+        entity_writer.write_str("  0\nSECTION\n  2\nENTITIES\n")
+        export_entities(doc, entity_writer, jobs, precision)
+        doc.layouts.active_layout().entity_space.export_dxf(entity_writer)
+        entity_writer.write_tag2(0, "ENDSEC")
+    elif stream_file is None:
+        doc.entities.export_dxf(entity_writer)
+    else:
+        entity_writer.write_str("  0\nSECTION\n  2\nENTITIES\n")
+        doc.modelspace().entity_space.export_dxf(entity_writer)
+        doc.layouts.active_layout().entity_space.export_dxf(entity_writer)
+        stream_file.seek(0)
+        for chunk in iter(lambda: stream_file.read(COPY_CHUNK), ""):
+            entity_writer.write_str(chunk)
+        entity_writer.write_tag2(0, "ENDSEC")
+    if tagwriter.dxfversion > DXF12:
+        doc.objects.export_dxf(tagwriter)
+    if doc.acdsdata.is_valid:
+        doc.acdsdata.export_dxf(tagwriter)
+    for section in doc.stored_sections:
+        section.export_dxf(tagwriter)
+    tagwriter.write_tag2(0, "EOF")
+
+def prepare_export(doc):
+    """ update the drawing before export the same way as ezdxf does on save
+
+        :param doc: ezdxf drawing to export
+    """
+    doc.commit_pending_changes()
+    if doc.dxfversion > DXF12:
+        doc.classes.add_required_classes(doc.dxfversion)
+    doc.update_all()
+
+def write_dxf(doc, stream, precision=None, jobs=1):
+    """ write drawing as ASCII DXF to a text stream
+
+        :param doc: ezdxf drawing to write
+        :param stream: text stream opened with the output encoding of doc
+        :param precision: number of decimals for coordinates, None no rounding
+        :param jobs: number of processes to serialize modelspace entities
+    """
+    prepare_export(doc)
+    handles = doc.dxfversion > DXF12 or bool(doc.header.get("$HANDLING", 0))
+    tagwriter = TagWriter(stream, doc.dxfversion, handles)
+    entity_writer = None
+    if precision is not None:
+        entity_writer = PrecisionTagWriter(stream, doc.dxfversion, handles,
+                                           precision)
+    export_sections(doc, tagwriter, entity_writer, jobs=jobs,
+                    precision=precision)
+
+def save_dxf(doc, file_name, precision=None, jobs=1):
+    """ save drawing to an ASCII DXF file
+
+        :param doc: ezdxf drawing to save
+        :param file_name: name of output DXF file
+        :param precision: number of decimals for coordinates, None no rounding
+        :param jobs: number of processes to serialize modelspace entities
+    """
+    if precision is None and not parallel_export(doc, jobs):
+        doc.saveas(file_name)
+        return
+    doc.filename = file_name
+    with open(file_name, "wt", encoding=doc.output_encoding,
+              errors="dxfreplace") as stream:
+        write_dxf(doc, stream, precision, jobs)
+
+class StreamWriter():
+    """ write POINT, INSERT, LWPOLYLINE and 3D POLYLINE entities to the
+        modelspace of the output without keeping them in the drawing,
+        the entities are written to a temporary file, the sections of the
+        template drawing and the streamed entities are merged by close(),
+        the add methods are compatible with the ezdxf layout methods
+
+        :param doc: template drawing, its entities are also written
+        :param file_name: name of output DXF file
+        :param precision: number of decimals for coordinates, None no rounding
+    """
+    def __init__(self, doc, file_name, precision=None):
+        """ initialize """
+        self.doc = doc
+        self.file_name = file_name
+        self.precision = precision
+        self.owner = doc.modelspace().layout_key
+        self.n_entities = 0
+        self.handles = doc.dxfversion > DXF12 or bool(doc.header.get("$HANDLING", 0))
+        # temporary file next to the output, it can be large
+        self.tmp = tempfile.TemporaryFile(
+            "w+t", encoding=doc.output_encoding, errors="dxfreplace",
+            dir=os.path.dirname(os.path.abspath(file_name)))
+        if precision is None:
+            self.tagwriter = TagWriter(self.tmp, doc.dxfversion, self.handles)
+        else:
+            self.tagwriter = PrecisionTagWriter(self.tmp, doc.dxfversion,
+                                                self.handles, precision)
+
+    def write(self, entity):
+        """ allocate handles and write entity with its sub-entities
+
+            :param entity: new entity not bound to the drawing
+            :returns: the entity
+        """
+        db = self.doc.entitydb
+        entity.dxf.handle = db.next_handle()
+        if isinstance(entity, Polyline):
+            for sub_entity in entity.vertices + [entity.seqend]:
+                sub_entity.dxf.handle = db.next_handle()
+        entity.set_owner(self.owner)
+        entity.export_dxf(self.tagwriter)
+        self.n_entities += 1
+        return entity
+
+    def add_point(self, location, dxfattribs=None):
+        """ write a POINT entity
+
+            :param location: point coordinates
+            :param dxfattribs: other DXF attributes
+        """
+        dxfattribs = dict(dxfattribs or {})
+        dxfattribs['location'] = location
+        return self.write(Point.new(dxfattribs=dxfattribs))
+
+    def add_blockref(self, name, insert, dxfattribs=None):
+        """ write an INSERT entity
+
+            :param name: block name
+            :param insert: insertion point
+            :param dxfattribs: other DXF attributes
+        """
+        dxfattribs = dict(dxfattribs or {})
+        dxfattribs['name'] = name
+        dxfattribs['insert'] = insert
+        return self.write(Insert.new(dxfattribs=dxfattribs))
+
+    def add_lwpolyline(self, points, format='xyseb', close=False,
+                       dxfattribs=None):
+        """ write a LWPOLYLINE entity, DXF R2000+
+
+            :param points: vertices of polyline
+            :param format: format of points
+            :param close: closed polyline
+            :param dxfattribs: other DXF attributes
+        """
+        if self.doc.dxfversion <= DXF12:
+            raise DXFVersionError("LWPOLYLINE requires DXF R2000")
+        entity = LWPolyline.new(dxfattribs=dict(dxfattribs or {}))
+        entity.set_points(points, format=format)
+        entity.closed = close
+        return self.write(entity)
+
+    def add_polyline3d(self, points, close=False, dxfattribs=None):
+        """ write a 3D POLYLINE entity
+
+            :param points: list of (x, y, z) vertices
+            :param close: closed polyline
+            :param dxfattribs: other DXF attributes
+        """
+        dxfattribs = dict(dxfattribs or {})
+        dxfattribs['flags'] = dxfattribs.get('flags', 0) | Polyline.POLYLINE_3D
+        entity = Polyline.new(dxfattribs=dxfattribs)
+        entity.append_vertices(points)
+        entity.new_seqend()
+        entity.close(close)
+        return self.write(entity)
+
+    def close(self):
+        """ write the output file with the template and the streamed entities """
+        doc = self.doc
+        prepare_export(doc)     # $HANDSEED after the streamed entities
+        doc.filename = self.file_name
+        with open(self.file_name, "wt", encoding=doc.output_encoding,
+                  errors="dxfreplace") as stream:
+            tagwriter = TagWriter(stream, doc.dxfversion, self.handles)
+            entity_writer = None
+            if self.precision is not None:
+                entity_writer = PrecisionTagWriter(stream, doc.dxfversion,
+                                                   self.handles, self.precision)
+            export_sections(doc, tagwriter, entity_writer, self.tmp)
+        self.tmp.close()
+
+def vertex_key(location, dims, precision):
+    """ rounded coordinates of a vertex to compare
+
+        :param location: vertex location (x, y, z)
+        :param dims: number of coordinates to use 2/3
+        :param precision: number of decimals
+    """
+    return tuple(round(location[i], precision) for i in range(dims))
+
+def drop_duplicate_vertices(doc, precision):
+    """ remove consecutive vertices of 2D/3D polylines which are identical
+        after rounding, widths and bulge of the removed vertex are kept
+
+        :param doc: ezdxf drawing to process (all blocks and layouts)
+        :param precision: number of decimals for comparison
+        :returns: number of vertices removed
+    """
+    n_removed = 0
+    for block in doc.blocks:
+        for entity in block.query('LWPOLYLINE'):
+            if len(entity) < 2:
+                continue
+            pnts = entity.get_points('xyseb')
+            keep = [pnts[0]]
+            key = vertex_key(pnts[0], 2, precision)
+            for pnt in pnts[1:]:
+                pnt_key = vertex_key(pnt, 2, precision)
+                if pnt_key == key:  # zero length segment
+                    keep[-1] = keep[-1][:2] + pnt[2:]
+                else:
+                    keep.append(pnt)
+                    key = pnt_key
+            if entity.closed and len(keep) > 2 and \
+               key == vertex_key(keep[0], 2, precision):
+                keep.pop()  # last vertex is the same as first
+            if 1 < len(keep) < len(pnts):
+                n_removed += len(pnts) - len(keep)
+                entity.set_points(keep, format='xyseb')
+        for entity in block.query('POLYLINE'):
+            if not (entity.is_2d_polyline or entity.is_3d_polyline):
+                continue
+            vertices = entity.vertices
+            if len(vertices) < 2:
+                continue
+            dims = 3 if entity.is_3d_polyline else 2
+            drop = []
+            keep = 0
+            key = vertex_key(vertices[0].dxf.location, dims, precision)
+            for i in range(1, len(vertices)):
+                v_key = vertex_key(vertices[i].dxf.location, dims, precision)
+                if v_key == key:    # zero length segment
+                    for attr in ('start_width', 'end_width', 'bulge'):
+                        if vertices[i].dxf.hasattr(attr):
+                            vertices[keep].dxf.set(attr, vertices[i].dxf.get(attr))
+                        else:
+                            vertices[keep].dxf.discard(attr)
+                    drop.append(i)
+                else:
+                    keep = i
+                    key = v_key
+            first = vertex_key(vertices[0].dxf.location, dims, precision)
+            if entity.is_closed and keep > 0 and key == first and \
+               len(vertices) - len(drop) > 2:
+                drop.append(keep)   # last vertex is the same as first
+            if 0 < len(drop) < len(vertices) - 1:
+                for i in sorted(drop, reverse=True):
+                    vertex = vertices.pop(i)
+                    if entity.doc:
+                        entity.doc.entitydb.delete_entity(vertex)
+                n_removed += len(drop)
+    return n_removed
@@ -6,24 +6,44 @@
 
     rule file may have from 2 to 5 fields separated by semicolon(;)
     1st field: unique part of the shape file as glob pattern to use as source for this rule
+               or OGR datasource glob pattern and layer glob pattern or SQL
+               query separated by | (e.g. data.gpkg|road* or
+               data.gpkg|SELECT * FROM roads WHERE lanes > 2)
     2nd field: target layer name in destination DXF file
     3rd field: attribute name(s) to use in rule (optional), names separated by &
     4th field: attribute value(s) for rule (optional)
     5th field: block name to insert in case of point shape (optional)
-    shp_id dxf_layer shp_attr_name shp_attr_value dxf_block_name
+    6th field: simplification tolerance for lines and polygons (optional),
+               Douglas-Peucker by default or Visvalingam-Whyatt with vw:
+               prefix for polygons (e.g. 0.5 or vw:0.5), shapely 2 needed,
+               vw layers are read at once, their lines use Douglas-Peucker
+    shp_id dxf_layer shp_attr_name shp_attr_value dxf_block_name simplify
 
     Sample rules:
 
 
 """
 import sys
+import re
+import struct
 import os.path
 import glob
+import shutil
+import tempfile
 import fnmatch
 import argparse
-from math import isclose
+from itertools import product
+from collections import Counter
+from multiprocessing import Pool
+import numpy as np
+try:
+    import shapely
+except ImportError:
+    shapely = None  # no simplification
 import ezdxf
-from osgeo import ogr
+from osgeo import ogr, osr
+from dxf_writer import save_dxf, drop_duplicate_vertices, StreamWriter
+from dxf_convert import merge_lines, MERGE_TOLERANCE
 
 # column index fro rules
 SHP_ID = 0
@@ -31,33 +51,160 @@ DXF_LAYER = 1
 SHP_ATTR_NAMES = 2
 SHP_ATTR_VALUES = 3
 DXF_BLOCK_NAME = 4
+SIMPLIFY = 5
+SIMPLIFY_METHODS = ('dp', 'vw')     # Douglas-Peucker, Visvalingam-Whyatt
 
-# shape types
-SHP_POINT = 1
-SHP_LINE = 2
-SHP_POLY = 3
-SHP_POINTZ = 11
-SHP_LINEZ = 13
-SHP_POLYZ = 15
-SHP_POINTM = 21
-SHP_LINEM = 23
-SHP_POLYM = 25
-SHP_TYPES = (SHP_POINT, SHP_LINE, SHP_POLY, SHP_POINTZ, SHP_LINEZ, SHP_POLYZ,
-             SHP_POINTM, SHP_LINEM, SHP_POLYM)
+SOURCE_SEP = '|'        # separator of datasource and layer in rules
+SQL_QUERY = re.compile(r'^\s*(SELECT|WITH)\s', re.IGNORECASE)
+GEOM_NONE = 100         # wkbNone, layer without geometry
+POINT_TYPES = (1, 4)    # point and multipoint geometry types
+POLYGON_TYPES = (3, 6)  # polygon and multipolygon geometry types
+
+CHUNK_SIZE = 10000  # features read at once in serial mode
+# field types supported in attribute filters pushed down to OGR
+SQL_NUMERIC_TYPES = (ogr.OFTInteger, ogr.OFTInteger64, ogr.OFTReal)
+SQL_NUMBER = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$')
+# coordinate transformations by source and target CRS, created once a process
+TRANSFORMATIONS = {}
+
+# WKB geometry types
+WKB_POINT = 1
+WKB_LINE = 2
+WKB_POLY = 3
+WKB_EWKB_Z = 0x80000000     # Z flag of extended WKB
+WKB_EWKB_M = 0x40000000     # M flag of extended WKB
+
+def load_srs(srs_def):
+    """ create a spatial reference system in x, y (east, north) axis order
+
+        :param srs_def: CRS definition, EPSG code (EPSG:23700), WKT,
+                        PROJ string or name of .prj file
+        :returns: OSR spatial reference, None if invalid
+    """
+    srs = osr.SpatialReference()
+    try:
+        if srs.SetFromUserInput(srs_def) != 0:
+            return None
+    except RuntimeError:    # GDAL exceptions enabled
+        return None
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+def coord_transformation(s_srs, t_srs):
+    """ get the coordinate transformation between two CRSs from the cache
+        or create it
+
+        :param s_srs: source CRS definition (WKT)
+        :param t_srs: target CRS definition
+        :returns: OSR coordinate transformation, None if identical CRSs
+                  or no transformation is available
+    """
+    key = (s_srs, t_srs)
+    if key not in TRANSFORMATIONS:
+        src = load_srs(s_srs)
+        dst = load_srs(t_srs)
+        ct = None
+        if src is not None and dst is not None and not src.IsSame(dst):
+            try:
+                ct = osr.CoordinateTransformation(src, dst)
+            except (RuntimeError, TypeError, ValueError):
+                ct = None
+        TRANSFORMATIONS[key] = ct
+    return TRANSFORMATIONS[key]
+
+def transform_points(ct, pnts):
+    """ transform coordinates in one call
+
+        :param ct: OSR coordinate transformation
+        :param pnts: numpy array of (x, y) or (x, y, z) rows
+        :returns: numpy array of transformed coordinates in the same shape
+    """
+    if len(pnts) == 0:
+        return pnts
+    res = np.array(ct.TransformPoints(np.ascontiguousarray(pnts, dtype=float)),
+                   dtype=float)
+    return res[:, :pnts.shape[1]]
+
+def wkb_parts(wkb):
+    """ decode vertices of a WKB geometry in bulk, M values are dropped
+
+        :param wkb: ISO or extended WKB of a geometry
+        :returns: list of (numpy array of (x, y) or (x, y, z) rows, closed)
+                  for points, lines and polygon rings, multi geometries and
+                  collections are flattened
+    """
+    parts = []
+    wkb_parse(memoryview(wkb), 0, parts)
+    return parts
+
+def wkb_parse(buf, offset, parts):
+    """ decode a WKB geometry from a buffer
+
+        :param buf: buffer of WKB
+        :param offset: start of geometry in buffer
+        :param parts: list to append the decoded parts to
+        :returns: offset after the geometry
+    """
+    order = '<' if buf[offset] == 1 else '>'
+    geom_type = struct.unpack_from(order + 'I', buf, offset + 1)[0]
+    offset += 5
+    has_z = bool(geom_type & WKB_EWKB_Z) or (geom_type & 0xffff) // 1000 in (1, 3)
+    has_m = bool(geom_type & WKB_EWKB_M) or (geom_type & 0xffff) // 1000 in (2, 3)
+    base = (geom_type & 0xffff) % 1000
+    dims = 2 + has_z + has_m
+    dtype = np.dtype(order + 'f8')
+    keep = 3 if has_z else 2    # drop M
+    if base == WKB_POINT:
+        pnts = np.frombuffer(buf, dtype, dims, offset).reshape(1, dims)
+        parts.append((pnts[:, :keep], False))
+        return offset + 8 * dims
+    count = struct.unpack_from(order + 'I', buf, offset)[0]
+    offset += 4
+    if base == WKB_LINE:
+        pnts = np.frombuffer(buf, dtype, count * dims, offset).reshape(count, dims)
+        parts.append((pnts[:, :keep], False))
+        return offset + 8 * dims * count
+    if base == WKB_POLY:
+        for _ in range(count):
+            n = struct.unpack_from(order + 'I', buf, offset)[0]
+            offset += 4
+            pnts = np.frombuffer(buf, dtype, n * dims, offset).reshape(n, dims)
+            parts.append((pnts[:, :keep], True))
+            offset += 8 * dims * n
+        return offset
+    for _ in range(count):  # multi geometries and collections
+        offset = wkb_parse(buf, offset, parts)
+    return offset
 
 class Shp2Dxf():
-    """ class to convert a group of SHP files to a single DXF file
+    """ class to convert a group of SHP files or layers of OGR datasources
+        to a single DXF file
 
-        :param shp_dir: input folder of shape files to convert
+        :param shp_dir: input folder of shape files and OGR datasources to convert
         :param dxf_template: empty template drawing with layer and block definitions
         :param dxf_out: name of output DXF file
         :param rules: name of the text file with rules
         :param encoding: encoding for rules file
         :param verbose: verbose output to stdout
+        :param precision: number of decimals for coordinates in output, None no rounding
+        :param drop_duplicates: drop consecutive polyline vertices identical after rounding
+        :param jobs: number of processes to read shape files and to write DXF
+        :param stream: write entities directly to the output file
+        :param clip: WKT polygon of the area to convert, None all features
+        :param exact: clip geometries at the boundary of the area
+        :param index: create temporary spatial index (.qix) of shape files
+                      without index for clip
+        :param s_srs: CRS of input data, None from the datasource (.prj)
+        :param t_srs: CRS of the DXF output, None no reprojection
+        :param merge: tolerance to join lines with coincident end points on
+                      the same layer, None no merge
     """
 
-    def __init__(self, shp_dir, dxf_template, dxf_out, rules, encoding, verbose):
+    def __init__(self, shp_dir, dxf_template, dxf_out, rules, encoding, verbose,
+                 precision=None, drop_duplicates=False, jobs=1, stream=False,
+                 clip=None, exact=False, index=False, s_srs=None, t_srs=None, merge=None):
         """ initialize """
+        self.shp_dir = shp_dir
         # get name of shape files
         self.shp_paths = glob.glob(os.path.join(shp_dir, '*.shp'))
         self.shp_names = [os.path.split(path)[1] for path in self.shp_paths]
@@ -67,6 +214,16 @@ class Shp2Dxf():
         self.dxf_out = dxf_out
         self.rules = self.load_rules(rules, encoding)     # load rules
         self.verbose = verbose
+        self.precision = precision
+        self.drop_duplicates = drop_duplicates
+        self.jobs = jobs
+        self.stream = stream
+        self.clip = clip
+        self.exact = exact
+        self.index = index
+        self.s_srs = s_srs
+        self.t_srs = t_srs
+        self.merge = merge
 
     @staticmethod
     def load_rules(rules, encoding):
@@ -100,21 +257,42 @@ class Shp2Dxf():
                         val_lists.append([x.strip() for x in vals.split(',')])
                     line_list[2] = col_list
                     line_list[3] = val_lists
+                if len(line_list) > SIMPLIFY and line_list[SIMPLIFY] is not None:
+                    line_list[SIMPLIFY] = Shp2Dxf.parse_simplify(line_list[SIMPLIFY])
                 res.append(line_list)
         res.sort()  # sort by shp name
         return res
 
+    @staticmethod
+    def parse_simplify(simplify):
+        """ parse simplification field of a rule
+
+            :param simplify: tolerance with optional method prefix (dp: or vw:)
+            :returns: tuple of method and tolerance or None
+        """
+        method, _, tolerance = simplify.rpartition(':')
+        method = method.strip().lower() or SIMPLIFY_METHODS[0]
+        try:
+            tolerance = float(tolerance)
+        except ValueError:
+            tolerance = -1
+        if method not in SIMPLIFY_METHODS or tolerance <= 0:
+            print(f"Invalid simplification, not used: {simplify}")
+            return None
+        if shapely is None:
+            print("shapely 2 is not installed, no simplification")
+            return None
+        return (method, tolerance)
+
     @staticmethod
     def is_2d(pnts):
-        """ check if points are in 2D
-            :param pnts: list of point coordinates [(x1, y1, z1), (x2, y2, z2), ...]
+        """ check if points are in 2D (all z values are the same)
+            :param pnts: numpy array of point coordinates [(x1, y1, z1), (x2, y2, z2), ...]
             :returns: True/False 2D/3D
         """
-        z_val = pnts[0][2]
-        for pnt in pnts[1:]:
-            if not isclose(z_val, pnt[2]):
-                return False
-        return True
+        if pnts.shape[1] < 3:
+            return True
+        return np.allclose(pnts[:, 2], pnts[0, 2], rtol=1e-9, atol=0)
 
     def shpid2paths(self, shp_id):
         """ extend shp id to path list
@@ -127,33 +305,37 @@ class Shp2Dxf():
                 found_path.append(path)
         return found_path
 
-    @staticmethod
-    def filter(feature, attr_names, attr_values):
-        """ check condition for attributes
+    def source2paths(self, source):
+        """ extend datasource pattern to path list
 
-            :param feature: feature from shp file
-            :param attr_names: list of column names for condition
-            :param attr_values: list of list with valid values
-            :returns: True/False
+            :param source: glob pattern to match to files in input folder
         """
-        for attr_name, attr_value in zip(attr_names, attr_values):
-            if str(feature.GetField(attr_name)) not in attr_value:
-                return False
-        return True
+        return sorted(glob.glob(os.path.join(self.shp_dir, source)))
 
-    def convert(self):
-        """ convert the shp files to dxf using rules """
-        templ_layers = [layer.dxf.name for layer in self.doc.layers]
-        templ_blocks = [block.name for block in self.doc.blocks]
-        msp = self.doc.modelspace() # modelspace to write to
-        for rule in self.rules:     # go through rules
+    def rule_targets(self):
+        """ check rules and group them by datasources and layers
+
+            :returns: dictionary of datasource path and dictionary of layer
+                      pattern or SQL (None for the first layer) and list of
+                      rule targets (rule index, layer, attribute names,
+                      attribute values, block, simplification)
+        """
+        templ_layers = {layer.dxf.name for layer in self.doc.layers}
+        templ_blocks = {block.name for block in self.doc.blocks}
+        targets = {}
+        for index, rule in enumerate(self.rules):   # go through rules
             shp_id = rule[SHP_ID]           # shape id (unique part of the name)
             dxf_layer = rule[DXF_LAYER]     # target dxf layer
             if dxf_layer not in templ_layers:
                 print(f"Missing layer in DXF template: {dxf_layer}")
                 print("Rule skipped")
                 continue
-            shp_paths = self.shpid2paths(shp_id)
+            if SOURCE_SEP in shp_id:
+                source, layer_spec = (x.strip() for x in shp_id.split(SOURCE_SEP, 1))
+                shp_paths = self.source2paths(source)
+            else:
+                layer_spec = None
+                shp_paths = self.shpid2paths(shp_id)
             if len(shp_paths) == 0:
                 print(f"No match for shp name pattern: {shp_id}")
                 print("Rule skipped")
@@ -164,6 +346,8 @@ class Shp2Dxf():
             shp_attr_values = None
             if len(rule) > 3 and rule[SHP_ATTR_VALUES] is not None:
                 shp_attr_values = rule[SHP_ATTR_VALUES]
+            if shp_attr_names is None or shp_attr_values is None:
+                shp_attr_names = shp_attr_values = None     # no filter
             dxf_block_name = None
             if len(rule) > 4 and rule[DXF_BLOCK_NAME] is not None:
                 dxf_block_name = rule[DXF_BLOCK_NAME]
@@ -171,67 +355,610 @@ class Shp2Dxf():
                     print(f"Missing block definition in DXF template: {dxf_block_name}")
                     print("Rule skipped")
                     continue
-            for shp_path in shp_paths:   # iprocess input shp files
-                if self.verbose:
-                    print(f"{shp_path} to {dxf_layer}")
-                shp_file = ogr.Open(shp_path)
-                shp_layer = shp_file.GetLayer(0)
-                geom_type = shp_layer.GetGeomType()
-                if geom_type not in SHP_TYPES:
-                    print(f"Invalid Shape type {geom_type} in {shp_path}")
-                    print(f"Rule skippedi for {shp_path}")
-                    shp_file = None     # close shp
-                    continue    # skip unsupported shape type
-                # collect field names
-                field_names = [field.name.lower() for field in shp_layer.schema]
-                if shp_attr_names:
-                    for shp_attr_name in shp_attr_names:
-                        if shp_attr_name not in field_names:
-                            print(f"Invalid attribute name {shp_attr_name}")
-                            print(f"Rule skippedi for {shp_path}")
-                            shp_file = None     # close shp
-                            continue    # attribute not in shape file skip
-                n_feature = 0
-                for feature in shp_layer:
-                    if shp_attr_names is None or shp_attr_values is None or \
-                       self.filter(feature, shp_attr_names, shp_attr_values):
-                        n_feature += 1  # count of converted items
-                        # copy geometry to target layer
-                        geom = feature.GetGeometryRef()
-                        if geom_type in (SHP_POINT, SHP_POINTZ, SHP_POINTM):
-                            pnt = geom.GetPoint(0)
-                            if dxf_block_name:
-                                msp.add_blockref(dxf_block_name, pnt,
-                                                 dxfattribs={'layer': dxf_layer})
-                            else:
-                                msp.add_point(pnt, dxfattribs={'layer': dxf_layer})
-                        elif geom_type in (SHP_LINE, SHP_LINEZ, SHP_LINEM):
-                            pnts = [geom.GetPoint(i) for i in range(geom.GetPointCount())]
-                            if len(pnts) > 1:
-                                if self.is_2d(pnts):
-                                    pnts = [(p[0], p[1]) for p in pnts]
-                                    msp.add_lwpolyline(pnts, dxfattribs={'layer': dxf_layer})
-                                else:
-                                    msp.add_polyline3d(pnts, dxfattribs={'layer': dxf_layer})
-                        elif geom_type in (SHP_POLY, SHP_POLYZ, SHP_POLYM):
-                            pnts = [geom.GetPoint(i) for i in range(geom.GetPointCount())]
-                            if len(pnts) > 1:
-                                if self.is_2d(pnts):
-                                    pnts = [(p[0], p[1]) for p in pnts]
-                                    msp.add_lwpolyline(pnts, close=True,
-                                                       dxfattribs={'layer': dxf_layer})
-                                else:
-                                    msp.add_polyline3d(pnts, close=True,
-                                                       dxfattribs={'layer': dxf_layer})
-                if self.verbose:
-                    print(f"{n_feature} features added to DXF")
-                shp_file = None
-        self.doc.saveas(self.dxf_out)
+            simplify = None
+            if len(rule) > SIMPLIFY:
+                simplify = rule[SIMPLIFY]
+            for shp_path in shp_paths:
+                targets.setdefault(shp_path, {}).setdefault(layer_spec, []).append(
+                    (index, dxf_layer, shp_attr_names, shp_attr_values,
+                     dxf_block_name, simplify))
+        return targets
+
+    @staticmethod
+    def dispatch_table(targets):
+        """ create lookup tables from attribute values to targets
+
+            :param targets: list of rule targets for a shape file
+            :returns: list of targets without filter and dictionary of
+                      attribute names to dictionary of value tuples to targets
+        """
+        always = []
+        tables = {}
+        for index, dxf_layer, attr_names, attr_values, block, simplify in targets:
+            target = (index, dxf_layer, block, simplify)
+            if attr_names is None:
+                always.append(target)
+                continue
+            table = tables.setdefault(tuple(attr_names), {})
+            for values in product(*attr_values):
+                matches = table.setdefault(values, [])
+                if target not in matches:
+                    matches.append(target)
+        return always, tables
+
+    @staticmethod
+    def attribute_filter(shp_layer, targets):
+        """ create OGR SQL where clause selecting the features of the rules,
+            the clause may select more features than the rules (e.g. 1.50
+            and 1.5 for real fields), the rules are checked for each
+            selected feature
+
+            :param shp_layer: OGR layer of shape file
+            :param targets: list of rule targets for a shape file
+            :returns: where clause or None if it cannot be created
+        """
+        fields = {field.name.lower(): (field.name, field.GetType())
+                  for field in shp_layer.schema}
+        clauses = []
+        for _, _, attr_names, attr_values, _, _ in targets:
+            if attr_names is None:
+                return None     # all features needed
+            conds = []
+            for attr_name, values in zip(attr_names, attr_values):
+                field_name, field_type = fields[attr_name]
+                if field_type != ogr.OFTString and field_type not in SQL_NUMERIC_TYPES:
+                    return None     # no pushdown for dates, lists, ...
+                literals = []
+                is_null = False
+                for value in values:
+                    if value == 'None':     # empty field
+                        is_null = True
+                        if field_type == ogr.OFTString:
+                            literals.append("'None'")   # or 'None' string
+                    elif field_type == ogr.OFTString:
+                        literals.append("'" + value.replace("'", "''") + "'")
+                    elif SQL_NUMBER.match(value):
+                        literals.append(value)
+                    elif value.lower().lstrip('+-') in ('nan', 'inf'):
+                        return None
+                    # other values never match numeric fields
+                cond = []
+                if literals:
+                    cond.append(f'"{field_name}" IN ({", ".join(literals)})')
+                if is_null:
+                    cond.append(f'"{field_name}" IS NULL')
+                if len(cond) == 0:
+                    break   # rule never matches
+                conds.append(' OR '.join(cond))
+            else:
+                clauses.append(' AND '.join(f'({cond})' for cond in conds))
+        if len(clauses) == 0:
+            return "1 = 0"  # no rule matches
+        return ' OR '.join(f'({clause})' for clause in clauses)
+
+    @staticmethod
+    def geometry_parts(geom):
+        """ decode vertices of a feature geometry
+
+            :param geom: OGR geometry of feature
+            :returns: list of (numpy array of points, closed), points have
+                      a single vertex, lines and rings more
+        """
+        if geom is None:
+            return []   # feature without geometry
+        return Shp2Dxf.wkb_geometry_parts(
+            geom.ExportToIsoWkb(),
+            ogr.GT_Flatten(geom.GetGeometryType()) in POINT_TYPES)
+
+    @staticmethod
+    def wkb_geometry_parts(wkb, is_point=False):
+        """ decode vertices of a WKB geometry
+
+            :param wkb: ISO WKB of geometry
+            :param is_point: point or multipoint geometry
+            :returns: list of (numpy array of points, closed)
+        """
+        if is_point:
+            return wkb_parts(wkb)
+        parts = []
+        for pnts, closed in wkb_parts(wkb):
+            if closed and len(pnts) > 2 and np.array_equal(pnts[0], pnts[-1]):
+                pnts = pnts[:-1]    # closing vertex is not repeated
+            if len(pnts) > 1:
+                parts.append((pnts, closed))
+        return parts
+
+    def add_parts(self, msp, parts, dxf_layer, dxf_block_name):
+        """ add decoded geometry to the modelspace
+
+            :param msp: modelspace to add to
+            :param parts: list of (numpy array of points, closed)
+            :param dxf_layer: target layer name
+            :param dxf_block_name: block to insert for points, None for DXF point
+        """
+        for pnts, closed in parts:
+            if len(pnts) == 1:  # point
+                pnt = pnts[0].tolist()
+                if dxf_block_name:
+                    msp.add_blockref(dxf_block_name, pnt,
+                                     dxfattribs={'layer': dxf_layer})
+                else:
+                    msp.add_point(pnt, dxfattribs={'layer': dxf_layer})
+            elif self.is_2d(pnts):
+                dxfattribs = {'layer': dxf_layer}
+                if pnts.shape[1] > 2 and pnts[0, 2] != 0:
+                    dxfattribs['elevation'] = float(pnts[0, 2])
+                msp.add_lwpolyline(pnts[:, :2].tolist(), close=closed,
+                                   dxfattribs=dxfattribs)
+            else:
+                msp.add_polyline3d(pnts.tolist(), close=closed,
+                                   dxfattribs={'layer': dxf_layer})
+
+    @staticmethod
+    def transform_records(records, ct):
+        """ transform the geometry of records in one batch
+
+            :param records: list of records [targets, geometry parts],
+                            records without parts are skipped
+            :param ct: OSR coordinate transformation
+        """
+        parts = [(record, pnts, closed) for record in records
+                 if record[1] is not None for pnts, closed in record[1]]
+        if len(parts) == 0:
+            return
+        pnts = np.concatenate([p if p.shape[1] == 3 else
+                               np.column_stack((p, np.zeros(len(p))))
+                               for _, p, _ in parts])
+        pnts = transform_points(ct, pnts)
+        for record in records:
+            if record[1] is not None:
+                record[1] = []
+        start = 0
+        for record, p, closed in parts:
+            record[1].append((pnts[start:start+len(p), :p.shape[1]], closed))
+            start += len(p)
+
+    @staticmethod
+    def finish_records(records, pending, stats, ct=None):
+        """ reproject and simplify the geometry of records
+
+            :param records: list of records [targets, geometry parts]
+            :param pending: list of records to simplify, see simplify
+            :param stats: dictionary of rule index and [vertices before, after]
+            :param ct: OSR coordinate transformation, None no reprojection
+        """
+        if ct is not None:
+            Shp2Dxf.transform_records(records, ct)
+        Shp2Dxf.simplify(pending, stats, ct)
+
+    @staticmethod
+    def simplify(pending, stats, ct=None):
+        """ simplify geometries of records in batches, one batch for each
+            simplification method and tolerance, the tolerance is in the
+            units of the target CRS
+
+            :param pending: list of (record, WKB, simplification, rule indices),
+                            geometry parts of records are set
+            :param stats: dictionary of rule index and [vertices before, after]
+            :param ct: OSR coordinate transformation, None no reprojection
+        """
+        batches = {}
+        for item in pending:
+            batches.setdefault(item[2], []).append(item)
+        for (method, tolerance), items in batches.items():
+            geoms = shapely.from_wkb([item[1] for item in items])
+            if ct is not None:
+                for has_z in (False, True):
+                    sel = shapely.has_z(geoms) == has_z
+                    geoms[sel] = shapely.transform(
+                        geoms[sel], lambda pnts: transform_points(ct, pnts),
+                        include_z=has_z)
+            simple = None
+            if method == 'vw':
+                # topology preserving for polygons sharing edges
+                polygons = shapely.get_type_id(geoms) == 3  # polygon
+                polygons |= shapely.get_type_id(geoms) == 6 # multipolygon
+                if hasattr(shapely, 'coverage_simplify') and np.any(polygons):
+                    try:
+                        simple = shapely.simplify(geoms, tolerance,
+                                                  preserve_topology=True)
+                        simple[polygons] = shapely.coverage_simplify(
+                            geoms[polygons], tolerance)
+                    except shapely.errors.GEOSException:
+                        simple = None   # invalid coverage
+            if simple is None:  # Douglas-Peucker
+                simple = shapely.simplify(geoms, tolerance, preserve_topology=True)
+            before = shapely.get_num_coordinates(geoms)
+            after = shapely.get_num_coordinates(simple)
+            for item, wkb, n_before, n_after in zip(
+                    items, shapely.to_wkb(simple, flavor='iso'), before, after):
+                item[0][1] = Shp2Dxf.wkb_geometry_parts(wkb)
+                for index in item[3]:
+                    stats.setdefault(index, [0, 0])
+                    stats[index][0] += int(n_before)
+                    stats[index][1] += int(n_after)
+
+    @staticmethod
+    def bbox2wkt(bbox):
+        """ create WKT polygon from a bounding box
+
+            :param bbox: string of xmin,ymin,xmax,ymax
+            :returns: WKT polygon or None on error
+        """
+        try:
+            xmin, ymin, xmax, ymax = (float(v) for v in bbox.split(','))
+        except ValueError:
+            print(f"Invalid bounding box: {bbox}")
+            return None
+        return f"POLYGON (({xmin} {ymin},{xmax} {ymin},{xmax} {ymax},{xmin} {ymax},{xmin} {ymin}))"
+
+    @staticmethod
+    def load_clip(file_name):
+        """ load clip polygon, union of the polygons in a vector file
+
+            :param file_name: vector file readable by OGR
+            :returns: WKT polygon or None on error
+        """
+        clip_file = ogr.Open(file_name)
+        if clip_file is None:
+            print(f"Clip file not loaded: {file_name}")
+            return None
+        geom = None
+        for feature in clip_file.GetLayer(0):
+            g = feature.GetGeometryRef()
+            if g is not None:
+                geom = g.Clone() if geom is None else geom.Union(g)
+        if geom is None or geom.IsEmpty():
+            print(f"No geometry in clip file: {file_name}")
+            return None
+        return geom.ExportToWkt()
+
+    @staticmethod
+    def spatial_index(shp_path, tmp_dir, messages):
+        """ create temporary spatial index (.qix) of a shape file if it has
+            no index, the shape file is copied to a temporary folder and
+            the index is created for the copy, the input folder is not changed
+
+            :param shp_path: path to shape file
+            :param tmp_dir: temporary folder for the copy
+            :param messages: list of messages to append to
+            :returns: path of the shape file to open
+        """
+        base = os.path.splitext(shp_path)[0]
+        for ext in ('.qix', '.QIX', '.sbn', '.SBN'):
+            if os.path.exists(base + ext):
+                return shp_path # index exists
+        for name in glob.glob(glob.escape(base) + '.*'):
+            if os.path.splitext(name)[0] == base:   # .shp, .shx, .dbf, .prj ...
+                shutil.copy(name, tmp_dir)
+        tmp_path = os.path.join(tmp_dir, os.path.basename(shp_path))
+        shp_file = ogr.Open(tmp_path, 1)    # update mode
+        if shp_file is None:
+            messages.append(f"Spatial index not created for {shp_path}")
+            return shp_path
+        name = shp_file.GetLayer(0).GetName()
+        shp_file.ExecuteSQL(f'CREATE SPATIAL INDEX ON "{name}"')
+        messages.append(f"Temporary spatial index created for {shp_path}")
+        shp_file = None
+        return tmp_path
+
+    def read_options(self):
+        """ options of reading shape files passed to read_shp
+
+            :returns: dictionary of options
+        """
+        return {'verbose': self.verbose, 'clip': self.clip,
+                'exact': self.exact, 'index': self.index,
+                's_srs': self.s_srs, 't_srs': self.t_srs}
+
+    @staticmethod
+    def clip_geometry(geom, clip_geom, clip_env):
+        """ clip a geometry exactly at the boundary of the area
+
+            :param geom: OGR geometry of feature
+            :param clip_geom: OGR geometry of the area
+            :param clip_env: envelope of the area if it is a rectangle, else None
+            :returns: clipped geometry, None if nothing remains,
+                      the original geometry if it cannot be clipped
+        """
+        if geom is None:
+            return None
+        if clip_env is not None:
+            env = geom.GetEnvelope()
+            if env[0] >= clip_env[0] and env[1] <= clip_env[1] and \
+               env[2] >= clip_env[2] and env[3] <= clip_env[3]:
+                return geom     # inside the rectangle
+        try:
+            clipped = geom.Intersection(clip_geom)
+        except RuntimeError:    # GDAL exceptions enabled
+            clipped = None
+        if clipped is None:
+            return geom     # invalid geometry, not clipped
+        if clipped.IsEmpty():
+            return None
+        return clipped
+
+    @staticmethod
+    def read_source(shp_path, layers, options, chunk_size=None):
+        """ read the layers of a datasource, the datasource is opened once
+
+            :param shp_path: path to shape file or OGR datasource
+            :param layers: dictionary of layer pattern or SQL (None for the
+                           first layer) and list of rule targets
+            :param options: dictionary of read options, see read_options
+            :param chunk_size: maximal number of records yielded at once, None all
+            :returns: generator of list of records (list of (layer, block)
+                      targets, geometry parts) and list of messages
+        """
+        messages = []
+        clip_geom = None
+        tmp_dir = None  # temporary copy of shape file with spatial index
+        open_path = shp_path
+        if options['clip']:
+            if options['index'] and shp_path.lower().endswith('.shp'):
+                tmp_dir = tempfile.TemporaryDirectory()
+                open_path = Shp2Dxf.spatial_index(shp_path, tmp_dir.name, messages)
+            clip_geom = ogr.CreateGeometryFromWkt(options['clip'])
+        shp_file = ogr.Open(open_path)
+        if shp_file is None:
+            messages.append(f"Datasource not opened, rules skipped: {shp_path}")
+            if tmp_dir is not None:
+                tmp_dir.cleanup()
+            yield [], messages
+            return
+        names = [shp_file.GetLayer(i).GetName()
+                 for i in range(shp_file.GetLayerCount())]
+        by_layer = {}   # rule targets by layer name
+        queries = []
+        for layer_spec, targets in layers.items():
+            if layer_spec is None:
+                matched = names[:1]
+            elif SQL_QUERY.match(layer_spec):
+                queries.append((layer_spec, targets))
+                continue
+            else:
+                matched = fnmatch.filter(names, layer_spec)
+            if len(matched) == 0:
+                messages.append(f"No layer {layer_spec} in {shp_path}, rules skipped")
+            for name in matched:
+                by_layer.setdefault(name, {}).update((t[0], t) for t in targets)
+        yield [], messages
+        for name in names:  # datasource order
+            if name in by_layer:
+                label = shp_path if layers.keys() == {None} else f"{shp_path}{SOURCE_SEP}{name}"
+                yield from Shp2Dxf.read_layer(
+                    shp_file.GetLayerByName(name), label,
+                    sorted(by_layer[name].values(), key=lambda t: t[0]),
+                    options, clip_geom, chunk_size)
+        for sql, targets in sorted(queries, key=lambda q: q[0]):
+            # the query is executed by the database engine (e.g. SQLite for GPKG)
+            shp_layer = shp_file.ExecuteSQL(sql, spatialFilter=clip_geom)
+            if shp_layer is None:
+                yield [], [f"Invalid SQL, rules skipped: {sql}"]
+                continue
+            yield from Shp2Dxf.read_layer(shp_layer, f"{shp_path}{SOURCE_SEP}{sql}",
+                                          targets, options, clip_geom,
+                                          chunk_size, filtered=True)
+            shp_file.ReleaseResultSet(shp_layer)
+        shp_file = None
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    @staticmethod
+    def layer_transformation(shp_layer, label, options, messages):
+        """ coordinate transformation from the CRS of a layer to the target CRS
+
+            :param shp_layer: OGR layer
+            :param label: name of layer in messages
+            :param options: dictionary of read options, see read_options
+            :param messages: list of messages to append to
+            :returns: OSR coordinate transformation, None no reprojection
+        """
+        if options['t_srs'] is None:
+            return None
+        s_srs = options['s_srs']
+        if s_srs is None:
+            srs = shp_layer.GetSpatialRef()
+            if srs is None:
+                messages.append(f"No CRS for {label}, not reprojected")
+                return None
+            s_srs = srs.ExportToWkt()
+        ct = coord_transformation(s_srs, options['t_srs'])
+        if ct is None and options['verbose']:
+            messages.append(f"{label} is not reprojected")
+        return ct
+
+    @staticmethod
+    def read_layer(shp_layer, label, targets, options, clip_geom=None,
+                   chunk_size=None, filtered=False):
+        """ read and filter the features of a layer
+
+            :param shp_layer: OGR layer
+            :param label: name of layer in messages
+            :param targets: list of rule targets for the layer
+            :param options: dictionary of read options, see read_options
+            :param clip_geom: OGR geometry of the area to convert, None all
+            :param chunk_size: maximal number of records yielded at once, None all
+            :param filtered: spatial filter is already applied (SQL query)
+            :returns: generator of list of records (list of (layer, block)
+                      targets, geometry parts) and list of messages
+        """
+        messages = []
+        records = []
+        verbose = options['verbose']
+        # 2.5D and measured types to the base type
+        geom_type = ogr.GT_Flatten(shp_layer.GetGeomType())
+        if geom_type == GEOM_NONE:
+            messages.append(f"No geometry in {label}")
+            messages.append(f"Rules skipped for {label}")
+            yield records, messages     # skip layer without geometry
+            return
+        # collect field names
+        field_names = [field.name.lower() for field in shp_layer.schema]
+        valid_targets = []
+        for target in targets:
+            missing = [name for name in target[2] or [] if name not in field_names]
+            if missing:
+                messages.append(f"Invalid attribute name {', '.join(missing)}")
+                messages.append(f"Rule skipped for {label}")
+                continue    # attribute not in shape file skip
+            valid_targets.append(target)
+        if len(valid_targets) == 0:
+            yield records, messages
+            return
+        if chunk_size is not None and \
+           any(t[5] is not None and t[5][0] == 'vw' for t in valid_targets):
+            # polygon coverage is simplified together for the whole layer
+            chunk_size = None
+        where = Shp2Dxf.attribute_filter(shp_layer, valid_targets)
+        if where is not None:
+            try:
+                # evaluated by the datasource (SQLite for GPKG)
+                if shp_layer.SetAttributeFilter(where) != 0:
+                    raise RuntimeError(where)
+                if verbose:
+                    messages.append(f"{label} filter: {where}")
+            except RuntimeError:
+                messages.append(f"Attribute filter not applied: {where}")
+                shp_layer.SetAttributeFilter(None)
+        clip_env = None     # envelope of rectangular clip area
+        if clip_geom is not None:
+            if not filtered:
+                # OGR uses the .qix/.sbn spatial index of shape files
+                # and the R-tree of GeoPackages
+                shp_layer.SetSpatialFilter(clip_geom)
+            if options['exact']:
+                env = clip_geom.GetEnvelope()
+                if abs(clip_geom.GetArea() - (env[1] - env[0]) * (env[3] - env[2])) <= \
+                   1e-9 * clip_geom.GetArea():
+                    clip_env = env
+        ct = Shp2Dxf.layer_transformation(shp_layer, label, options, messages)
+        always, tables = Shp2Dxf.dispatch_table(valid_targets)
+        # attribute names to field indices
+        indices = {names: [field_names.index(name) for name in names]
+                   for names in tables}
+        n_feature = Counter()   # number of converted features by rule
+        pending = []    # records to simplify
+        stats = {}      # vertices before and after simplification by rule
+        vw_lines = False    # lines of Visvalingam-Whyatt rules
+        for feature in shp_layer:
+            matches = list(always)
+            for names, table in tables.items():
+                values = tuple(str(feature.GetField(i)) for i in indices[names])
+                matches += table.get(values, [])
+            if len(matches) == 0:
+                continue
+            geom = feature.GetGeometryRef()
+            if clip_geom is not None and options['exact']:
+                geom = Shp2Dxf.clip_geometry(geom, clip_geom, clip_env)
+                if geom is None:
+                    continue    # only the envelope intersects the area
+            matches.sort(key=lambda m: m[0])
+            for match in matches:
+                n_feature[match[0]] += 1    # count of converted items
+            if geom is not None and \
+               ogr.GT_Flatten(geom.GetGeometryType()) in POINT_TYPES:
+                simplified = {None: matches}    # no simplification of points
+            else:
+                simplified = {}     # matches by simplification
+                for match in matches:
+                    simplified.setdefault(match[3], []).append(match)
+            for simplify, group in simplified.items():
+                record = [[match[1:3] for match in group], None]
+                if simplify is None or geom is None:
+                    record[1] = Shp2Dxf.geometry_parts(geom)
+                else:
+                    pending.append((record, geom.ExportToIsoWkb(), simplify,
+                                    [match[0] for match in group]))
+                    if simplify[0] == 'vw' and ogr.GT_Flatten(
+                            geom.GetGeometryType()) not in POLYGON_TYPES:
+                        vw_lines = True
+                records.append(record)
+            if chunk_size is not None and len(records) >= chunk_size:
+                Shp2Dxf.finish_records(records, pending, stats, ct)
+                pending = []
+                yield records, messages
+                records = []
+                messages = []
+        Shp2Dxf.finish_records(records, pending, stats, ct)
+        if verbose:
+            for target in valid_targets:
+                messages.append(f"{label} to {target[1]}: {n_feature[target[0]]} features added to DXF")
+        for target in valid_targets:
+            if target[0] in stats:
+                before, after = stats[target[0]]
+                messages.append(f"{label} to {target[1]}: simplified {before} -> {after} vertices "
+                                f"({100 * after / max(before, 1):.1f}%)")
+        if vw_lines:
+            messages.append(f"Visvalingam-Whyatt is for polygons, lines of {label} "
+                            "simplified by Douglas-Peucker")
+        yield records, messages
+
+    def add_results(self, msp, results):
+        """ add the records read from the datasources to the output
+
+            :param msp: modelspace or StreamWriter to add to
+            :param results: iterable of list of records and list of messages
+        """
+        for records, messages in results:
+            for message in messages:
+                print(message)
+            for matches, parts in records:
+                for dxf_layer, dxf_block_name in matches:
+                    # copy geometry to target layer
+                    self.add_parts(msp, parts, dxf_layer, dxf_block_name)
+
+    def convert(self):
+        """ convert the shp files to dxf using rules, each shape file is read
+            once and its features are dispatched to all matching rules,
+            shape files are read parallel if more jobs are given, the
+            entities are added in the same order as in serial mode,
+            in stream mode the entities are written to the output file
+            directly, in serial mode memory use does not depend on the
+            size of the data
+        """
+        if self.stream:
+            msp = StreamWriter(self.doc, self.dxf_out, self.precision)
+            if self.drop_duplicates:
+                print("Duplicated vertices are not dropped in stream mode")
+            if self.merge is not None:
+                print("Lines are not merged in stream mode")
+        else:
+            msp = self.doc.modelspace() # modelspace to write to
+            n_templ = len(msp)  # entities of the template
+        options = self.read_options()
+        jobs = [(shp_path, layers, options)
+                for shp_path, layers in sorted(self.rule_targets().items())]
+        if self.jobs > 1 and len(jobs) > 1:
+            with Pool(min(self.jobs, len(jobs))) as pool:
+                self.add_results(msp, (chunk for chunks in pool.imap(read_job, jobs)
+                                       for chunk in chunks))
+        else:
+            self.add_results(msp, (chunk for job in jobs
+                                   for chunk in Shp2Dxf.read_source(*job, CHUNK_SIZE)))
+        if self.stream:
+            msp.close()
+            return
+        if self.merge is not None:
+            # template entities are not merged
+            n_merged, n_new = merge_lines(msp, list(msp)[n_templ:], self.merge)
+            print(f"{n_merged} lines merged into {n_new} polylines")
+        if self.precision is not None and self.drop_duplicates:
+            drop_duplicate_vertices(self.doc, self.precision)
+        save_dxf(self.doc, self.dxf_out, self.precision, self.jobs)
+
+def read_job(job):
+    """ read a datasource in a worker process
+
+        :param job: tuple of datasource path, rule targets by layers and read options
+        :returns: list of records and messages
+    """
+    return list(Shp2Dxf.read_source(*job))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('dir', metavar='shp_dir', type=str, nargs=1,
-                        help='Folder of shape files to convert')
+                        help='Folder of shape files and OGR datasources to convert')
     parser.add_argument('-r', '--rules', type=str,
                         help='Conversion rules')
     parser.add_argument('-o', '--out_dxf', type=str,
@@ -242,7 +969,48 @@ if __name__ == "__main__":
                         help=f'Encoding for rules file, default {sys.getdefaultencoding()}')
     parser.add_argument('-v', '--verbose', action="store_true",
                         help='verbose output to stdout')
+    parser.add_argument('-p', '--precision', type=int, default=None,
+                        help='Number of decimals for coordinates in output')
+    parser.add_argument('-d', '--drop_duplicates', action="store_true",
+                        help='Drop consecutive polyline vertices identical after rounding')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes to read shape files and write DXF, default 1')
+    parser.add_argument('-s', '--stream', action="store_true",
+                        help='Write entities directly to the output, for large data')
+    parser.add_argument('-b', '--bbox', type=str, default=None,
+                        help='Convert features in bounding box only: --bbox=xmin,ymin,xmax,ymax')
+    parser.add_argument('-c', '--clip', type=str, default=None,
+                        help='Convert features in the polygon(s) of a vector file only')
+    parser.add_argument('-x', '--exact', action="store_true",
+                        help='Clip geometries at the boundary of bbox/clip area')
+    parser.add_argument('-i', '--index', action="store_true",
+                        help='Create temporary spatial index of shape files without index for bbox/clip, '
+                        'the shape files are copied to a temporary folder')
+    parser.add_argument('--s_srs', type=str, default=None,
+                        help='CRS of input data (e.g. EPSG:4326), default from datasources (.prj)')
+    parser.add_argument('--t_srs', type=str, default=None,
+                        help='Reproject to CRS (e.g. EPSG:23700), bbox/clip in input CRS')
+    parser.add_argument('-m', '--merge', action="store_true",
+                        help='Join lines with coincident end points on the same layer')
+    parser.add_argument('--merge_tol', type=float, default=MERGE_TOLERANCE,
+                        help=f'Tolerance for coincident end points, default {MERGE_TOLERANCE}')
     args = parser.parse_args()
+    for srs_def in (args.s_srs, args.t_srs):
+        if srs_def is not None and load_srs(srs_def) is None:
+            print(f"*** ERROR Invalid CRS: {srs_def}")
+            sys.exit()
+    clip = None
+    if args.clip:
+        clip = Shp2Dxf.load_clip(args.clip)
+        if clip is None:
+            sys.exit()
+    elif args.bbox:
+        clip = Shp2Dxf.bbox2wkt(args.bbox)
+        if clip is None:
+            sys.exit()
     S2D = Shp2Dxf(args.dir[0], args.template, args.out_dxf, args.rules,
-                  args.encoding, args.verbose)
+                  args.encoding, args.verbose, args.precision,
+                  args.drop_duplicates, args.jobs, args.stream, clip,
+                  args.exact, args.index, args.s_srs, args.t_srs,
+                  args.merge_tol if args.merge else None)
     S2D.convert()
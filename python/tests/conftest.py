@@ -0,0 +1,5 @@
+""" pytest configuration, the scripts are imported from the parent folder """
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,47 @@
+""" tests of block2svg """
+import os
+import ezdxf
+import pytest
+from block2svg import Block2
+
+@pytest.fixture
+def blocks_dxf(tmp_path):
+    """ DXF file with some blocks """
+    doc = ezdxf.new('R2010')
+    doc.blocks.new('LINE').add_line((0, 0), (1, 0))
+    block = doc.blocks.new('MIXED', base_point=(1, 1))
+    block.add_circle((1, 1), 0.5)
+    block.add_arc((1, 1), 1, 0, 90)
+    block.add_lwpolyline([(0, 0, 0.5), (2, 0, 0), (2, 2, 0)], format='xyb', close=True)
+    block.add_text('A&B', dxfattribs={'insert': (0, 0), 'height': 0.25})
+    for i in range(6):
+        doc.blocks.new(f'B{i}').add_line((0, 0), (i, i / 3))
+    doc.saveas(tmp_path / 'blocks.dxf')
+    return str(tmp_path / 'blocks.dxf')
+
+def convert(dxf_name, out_path, out_type, jobs):
+    """ convert all blocks and return the output files by name """
+    os.makedirs(out_path)
+    Block2(dxf_name, '*', str(out_path), out_type, 100, 100, False, 10, 1,
+           'black', jobs).convert()
+    res = {}
+    for name in sorted(os.listdir(out_path)):
+        with open(os.path.join(out_path, name), encoding='utf-8') as f:
+            res[name] = f.read()
+    return res
+
+def test_path_data(blocks_dxf, tmp_path):
+    files = convert(blocks_dxf, tmp_path / 'svg', 'svg', 1)
+    assert len(files) == 8
+    assert 'd="M0,0L10,0"' in files['LINE.svg']
+    mixed = files['MIXED.svg']
+    assert 'M5,0A5,5 0 1 0 -5,0A5,5 0 1 0 5,0Z' in mixed     # circle
+    assert 'M10,0A10,10 0 0 0 0,-10' in mixed                   # arc
+    assert 'M-10,10A' in mixed and 'Z' in mixed                 # polyline
+    assert '>A&amp;B</text>' in mixed
+
+@pytest.mark.parametrize('out_type', ['svg', 'sprite'])
+def test_jobs(blocks_dxf, tmp_path, out_type):
+    serial = convert(blocks_dxf, tmp_path / f'{out_type}1', out_type, 1)
+    parallel = convert(blocks_dxf, tmp_path / f'{out_type}2', out_type, 3)
+    assert serial == parallel
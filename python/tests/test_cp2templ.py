@@ -0,0 +1,104 @@
+""" tests of cp2templ """
+import os
+import pytest
+import ezdxf
+from ezdxf.lldxf.tagwriter import TagCollector
+from block_manifest import HANDLE_CODES
+from cp2templ import Cp2Templ, batch
+
+@pytest.fixture
+def drawings(tmp_path):
+    """ source drawing, template and layer/block translator tables """
+    templ = ezdxf.new('R2010')
+    for name in ('ROAD', 'ALL'):
+        templ.layers.add(name)
+    templ.blocks.new('TREEB').add_circle((0, 0), 0.5)
+    templ.saveas(tmp_path / 'templ.dxf')
+    src = ezdxf.new('R2010')
+    for name in ('A', 'B', 'ATTL', 'MISSING'):
+        src.layers.add(name)
+    src.styles.add('MyStyle', font='arial.ttf')
+    block = src.blocks.new('TREEB')
+    block.add_circle((0, 0), 1)
+    block.add_attdef('ID', (0, 0))
+    src.blocks.new('SYM').add_line((0, 0), (1, 1))
+    msp = src.modelspace()
+    msp.add_line((0, 0), (1, 0), dxfattribs={'layer': 'A', 'color': 1})
+    insert = msp.add_blockref('TREEB', (5, 5), dxfattribs={'layer': 'B'})
+    insert.add_attrib('ID', '1', (5, 5), dxfattribs={'layer': 'ATTL', 'style': 'MyStyle'})
+    msp.add_leader([(0, 0), (1, 1), (2, 1)], dxfattribs={'layer': 'A'})
+    msp.add_text('text', dxfattribs={'layer': 'B', 'style': 'MyStyle'})
+    msp.add_blockref('SYM', (1, 1), dxfattribs={'layer': 'A'})
+    msp.add_circle((0, 0), 3, dxfattribs={'layer': 'MISSING'})
+    msp.add_polyline2d([(0, 0), (1, 1), (2, 0)], dxfattribs={'layer': 'B'})
+    msp.add_polyline3d([(0, 0, 1), (1, 1, 2)], dxfattribs={'layer': 'A'})
+    msp.add_linear_dim(base=(0, 3), p1=(0, 0), p2=(3, 0),
+                       dxfattribs={'layer': 'B'}).render()
+    msp.add_lwpolyline([(0, 0), (1, 1), (2, 0)], dxfattribs={'layer': 'B'})
+    src.saveas(tmp_path / 'src.dxf')
+    (tmp_path / 'layers.txt').write_text('A;ROAD\nB;ALL\n')
+    (tmp_path / 'blocks.txt').write_text('SYM;TREEB\n')
+    return tmp_path
+
+def entity_tags(doc):
+    """ tags of the modelspace entities without handles """
+    collector = TagCollector(dxfversion=doc.dxfversion)
+    for entity in doc.modelspace():
+        entity.export_dxf(collector)
+    return [(tag.code, tag.value) for tag in collector.tags
+            if tag.code not in HANDLE_CODES]
+
+def copy(path, bulk):
+    """ copy source to template and load the output """
+    out = str(path / f'out_{bulk}.dxf')
+    Cp2Templ(str(path / 'src.dxf'), str(path / 'templ.dxf'), out,
+             str(path / 'layers.txt'), str(path / 'blocks.txt'), bulk=bulk).copy()
+    return ezdxf.readfile(out)
+
+def test_bulk_same_as_normal(drawings):
+    normal = copy(drawings, False)
+    bulk = copy(drawings, True)
+    assert entity_tags(bulk) == entity_tags(normal)
+    for table in ('layers', 'styles', 'blocks'):
+        names = [[e.name if table == 'blocks' else e.dxf.name for e in getattr(doc, table)]
+                 for doc in (normal, bulk)]
+        assert names[0] == names[1]
+
+def test_table_duplicates(tmp_path, capsys):
+    table = tmp_path / 'layers.txt'
+    table.write_text('A;FIRST\nA*;PATTERN\nA;LAST\n')
+    translator = Cp2Templ.load_table(str(table))
+    assert 'Duplicated name' in capsys.readouterr().out
+    assert translator.translate('A') == 'LAST'
+    assert translator.translate('AB') == 'PATTERN'
+
+def test_empty_table_names(tmp_path):
+    ezdxf.new('R2010').saveas(tmp_path / 'src.dxf')
+    ezdxf.new('R2010').saveas(tmp_path / 'templ.dxf')
+    cp = Cp2Templ(str(tmp_path / 'src.dxf'), str(tmp_path / 'templ.dxf'),
+                  str(tmp_path / 'out.dxf'), '', '')
+    assert cp.layer_table is None and cp.block_table is None
+
+def test_batch_output_names(tmp_path, capsys):
+    for name in ('a/src.dxf', 'b/src.dxf', 'templ.dxf'):
+        os.makedirs((tmp_path / name).parent, exist_ok=True)
+        ezdxf.new('R2010').saveas(tmp_path / name)
+    sources = [str(tmp_path / 'a' / 'src.dxf'), str(tmp_path / 'b' / 'src.dxf')]
+    # same output name for two sources
+    batch(sources, str(tmp_path / 'templ.dxf'), str(tmp_path / 'out'))
+    assert 'Same output file' in capsys.readouterr().out
+    assert not (tmp_path / 'out').exists()
+    # output directory is the source directory
+    mtime = os.path.getmtime(sources[0])
+    batch(sources[:1], str(tmp_path / 'templ.dxf'), str(tmp_path / 'a' / '.'))
+    assert 'overwrite the source' in capsys.readouterr().out
+    assert os.path.getmtime(sources[0]) == mtime
+
+def test_default_copy(drawings):
+    doc = copy(drawings, False)
+    msp = doc.modelspace()
+    assert [e.dxftype() for e in msp] == ['LINE', 'INSERT', 'LEADER', 'TEXT', 'INSERT',
+                                        'POLYLINE', 'POLYLINE', 'DIMENSION', 'LWPOLYLINE']
+    # blocks of INSERTs are imported from the source by the Importer
+    assert [e.dxf.name for e in msp.query('INSERT')] == ['TREEB0', 'SYM']
+    assert 'TREEB0' in doc.blocks and 'SYM' in doc.blocks
@@ -0,0 +1,39 @@
+""" tests of entity conversions of dxf_convert """
+import ezdxf
+from ezdxf.math import Vec3
+from dxf_convert import Transformation, polyline2lwpolyline
+
+def test_polyline2lwpolyline_order():
+    doc = ezdxf.new('R2010')
+    msp = doc.modelspace()
+    msp.add_line((0, 0), (1, 1))
+    msp.add_polyline2d([(0, 0), (1, 1), (2, 0)], dxfattribs={'layer': 'P1'})
+    msp.add_circle((0, 0), 1)
+    msp.add_polyline3d([(0, 0, 1), (1, 1, 2)])
+    msp.add_polyline2d([(0, 0), (3, 1)], close=True, dxfattribs={'layer': 'P2'})
+    assert polyline2lwpolyline(msp) == 2
+    assert [(e.dxftype(), e.dxf.layer) for e in msp] == [
+        ('LINE', '0'), ('LWPOLYLINE', 'P1'), ('CIRCLE', '0'), ('POLYLINE', '0'),
+        ('LWPOLYLINE', 'P2')]
+    assert msp[4].closed
+    assert not doc.audit().has_errors
+
+def test_transform_attributed_insert():
+    doc = ezdxf.new('R2010')
+    blk = doc.blocks.new('B')
+    blk.add_circle((0, 0), 1)
+    blk.add_attdef('ID', (1, 0), dxfattribs={'height': 0.5})
+    msp = doc.modelspace()
+    ins = msp.add_blockref('B', (10, 20))
+    ins.add_auto_attribs({'ID': '1'})
+    attrib = ins.attribs[0]
+    trans = Transformation.helmert(100, 200, rotation=90, scale=2)
+    assert trans.batched(ins)
+    assert trans.transform_entities([ins]) == (1, 0)
+    assert Vec3(ins.dxf.insert).isclose((60, 220, 0))
+    assert ins.dxf.xscale == 2 and ins.dxf.yscale == 2
+    assert abs(ins.dxf.rotation - 90) < 1e-9
+    # the attribute follows the block reference
+    assert Vec3(attrib.dxf.insert).isclose((60, 222, 0))
+    assert abs(attrib.dxf.height - 1) < 1e-9
+    assert abs(attrib.dxf.rotation - 90) < 1e-9
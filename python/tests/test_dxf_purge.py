@@ -0,0 +1,49 @@
+""" tests of dxf_purge """
+import ezdxf
+from dxf_purge import DxfPurge
+
+def test_purge(tmp_path):
+    doc = ezdxf.new('R2010')
+    for name in ('USED', 'UNUSED', 'ATT', 'NESTED', 'CURRENT'):
+        doc.layers.add(name)
+    doc.header['$CLAYER'] = 'CURRENT'
+    doc.header['$USERI1'] = 42
+    doc.linetypes.add('LT1', [0.5, 0.25, -0.25])
+    doc.layers.get('USED').dxf.linetype = 'LT1'
+    doc.blocks.new('INNER').add_line((0, 0), (1, 0), dxfattribs={'layer': 'NESTED'})
+    doc.blocks.new('OUTER').add_blockref('INNER', (0, 0))
+    doc.blocks.new('DEAD').add_circle((0, 0), 1, dxfattribs={'layer': 'UNUSED'})
+    insert = doc.modelspace().add_blockref('OUTER', (0, 0), dxfattribs={'layer': 'USED'})
+    insert.add_attrib('T', 'v', dxfattribs={'layer': 'ATT'})
+    doc.layout('Layout1').add_text('paper', dxfattribs={'layer': 'USED'})
+    doc.saveas(tmp_path / 'src.dxf')
+    DxfPurge(str(tmp_path / 'src.dxf'), str(tmp_path / 'out.dxf')).purge()
+    out = ezdxf.readfile(tmp_path / 'out.dxf')
+    assert [layer.dxf.name for layer in out.layers] == \
+        ['0', 'Defpoints', 'USED', 'ATT', 'NESTED', 'CURRENT']
+    assert 'LT1' in out.linetypes
+    assert 'DEAD' not in out.blocks and 'INNER' in out.blocks
+    # header and layouts are kept
+    assert out.header['$CLAYER'] == 'CURRENT' and out.header['$USERI1'] == 42
+    assert len(out.layout('Layout1')) == 1
+    assert not out.audit().has_errors
+
+def test_purge_style_references(tmp_path):
+    doc = ezdxf.new('R2010')
+    doc.styles.add('LTTXT', font='arial.ttf')
+    doc.styles.add('MLTXT', font='arial.ttf')
+    doc.styles.add('UNUSED', font='arial.ttf')
+    doc.linetypes.add('GASLINE', pattern='A,.5,-.2,["GAS",LTTXT,S=.1,U=0.0,X=-0.1,Y=-.05],-.25',
+                      description='Gas ----GAS----', length=1)
+    doc.layers.add('GAS', linetype='GASLINE')
+    doc.modelspace().add_line((0, 0), (1, 0), dxfattribs={'layer': 'GAS'})
+    # text style referenced by handle from the OBJECTS section
+    mleader_style = doc.mleader_styles.new('ML')
+    mleader_style.dxf.text_style_handle = doc.styles.get('MLTXT').dxf.handle
+    doc.saveas(tmp_path / 'src.dxf')
+    DxfPurge(str(tmp_path / 'src.dxf'), str(tmp_path / 'out.dxf')).purge()
+    out = ezdxf.readfile(tmp_path / 'out.dxf')
+    assert [style.dxf.name for style in out.styles] == ['Standard', 'LTTXT', 'MLTXT']
+    handle = out.linetypes.get('GASLINE').pattern_tags.get_style_handle()
+    assert out.entitydb[handle].dxf.name == 'LTTXT'
+    assert not out.audit().has_errors
@@ -0,0 +1,51 @@
+""" tests of dxf_tile """
+import os
+import ezdxf
+import pytest
+from dxf_tile import DxfTile
+
+@pytest.fixture
+def drawing(tmp_path):
+    """ DXF file with one small circle in each cell of a 3 x 2 grid and
+        a line crossing the border of two cells """
+    doc = ezdxf.new('R2010')
+    doc.layers.add('C')
+    msp = doc.modelspace()
+    for col in range(3):
+        for row in range(2):
+            msp.add_circle((col * 10 + 5, row * 10 + 5), 1,
+                           dxfattribs={'layer': 'C'})
+    msp.add_line((8, 2), (12, 2))
+    doc.saveas(tmp_path / 'map.dxf')
+    return str(tmp_path / 'map.dxf')
+
+def test_bins(drawing, tmp_path):
+    tiler = DxfTile(drawing, str(tmp_path / 'tile'), 10, 10)
+    cells, n_skipped = tiler.bins()
+    assert n_skipped == 0
+    assert sorted(cells) == [(c, r) for c in range(3) for r in range(2)]
+    circles = [e.dxf.handle for e in tiler.doc.modelspace().query('CIRCLE')]
+    line = tiler.doc.modelspace().query('LINE')[0].dxf.handle
+    # each circle is in exactly one tile, the crossing line in both cells
+    for handle in circles:
+        assert sum(handle in handles for handles in cells.values()) == 1
+    assert [cell for cell, handles in cells.items() if line in handles] == [(0, 0), (1, 0)]
+    # circles reach into the neighbour cells by the margin
+    cells, _ = DxfTile(drawing, str(tmp_path / 'tile'), 10, 10, margin=5).bins()
+    assert sorted(cell for cell, handles in cells.items() if circles[0] in handles) == \
+        [(c, r) for c in range(-1, 2) for r in range(-1, 2)]
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_tile_files(drawing, tmp_path, jobs):
+    target = tmp_path / f'out{jobs}' / 'tile'
+    os.makedirs(target.parent)
+    DxfTile(drawing, str(target), 10, 10, jobs=jobs).tile()
+    names = sorted(os.listdir(target.parent))
+    assert names == [f'tile_{c}_{r}.dxf' for c in range(3) for r in range(2)]
+    centers = []
+    for name in names:
+        doc = ezdxf.readfile(target.parent / name)
+        assert 'C' in doc.layers
+        centers += [tuple(e.dxf.center) for e in doc.modelspace().query('CIRCLE')]
+    assert sorted(centers) == sorted((c * 10 + 5, r * 10 + 5, 0)
+                                     for c in range(3) for r in range(2))
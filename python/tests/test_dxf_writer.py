@@ -0,0 +1,60 @@
+""" tests of dxf_writer """
+import io
+import multiprocessing
+import pytest
+import ezdxf
+import dxf_writer
+from dxf_writer import write_dxf, parallel_export
+
+def entities_section(text):
+    """ ENTITIES section of a DXF document as string """
+    start = text.index('ENTITIES\n')
+    return text[start:text.index('ENDSEC', start)]
+
+def sample_doc(n=60):
+    """ drawing with lines, polylines and circles """
+    doc = ezdxf.new('R2010')
+    msp = doc.modelspace()
+    for i in range(n):
+        msp.add_line((i / 3, 0), (i, 2 / 3))
+        msp.add_lwpolyline([(0, i / 7), (1 / 3, i), (i, 5 / 9)])
+        msp.add_circle((i / 11, i / 13), 1 / 3)
+    return doc
+
+def test_rounding():
+    doc = ezdxf.new('R2010')
+    msp = doc.modelspace()
+    msp.add_line((0.123456, 1.987654), (2.5, 3.33333))
+    msp.add_ellipse((1.123456, 2.123456), major_axis=(3.33333, 0), ratio=0.123456789)
+    msp.add_mtext('x', dxfattribs={'insert': (1.23456, 2.34567),
+                                   'text_direction': (0.70710678, 0.70710678, 0)})
+    msp.add_open_spline([(0, 0), (1.11111, 2.22222), (3.3333, 1.23456), (5, 5), (6, 1)],
+                        knots=[0, 0, 0, 0, 0.3333333, 1, 1, 1, 1])
+    stream = io.StringIO()
+    write_dxf(doc, stream, precision=2)
+    line, ellipse, mtext, spline = ezdxf.read(io.StringIO(stream.getvalue())).modelspace()
+    assert tuple(line.dxf.start) == (0.12, 1.99, 0)
+    assert tuple(ellipse.dxf.center) == (1.12, 2.12, 0)
+    assert ellipse.dxf.ratio == 0.123456789
+    assert tuple(mtext.dxf.insert) == (1.23, 2.35, 0)
+    assert tuple(mtext.dxf.text_direction) == (0.70710678, 0.70710678, 0)
+    assert list(spline.knots)[4] == 0.3333333
+    assert tuple(spline.control_points[1]) == (1.11, 2.22, 0)
+
+def test_small_drawing_serial():
+    assert not parallel_export(sample_doc(), 4)
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                    reason='parallel export needs fork')
+def test_parallel_export(monkeypatch):
+    monkeypatch.setattr(dxf_writer, 'PARALLEL_EXPORT_MIN', 10)
+    monkeypatch.setattr(dxf_writer, 'EXPORT_CHUNK', 7)
+    doc = sample_doc()
+    assert parallel_export(doc, 2)
+    sections = []
+    for jobs in (1, 2):
+        stream = io.StringIO()
+        write_dxf(doc, stream, precision=3, jobs=jobs)
+        sections.append(entities_section(stream.getvalue()))
+    assert sections[0] == sections[1]
+    assert sections[0].count('LWPOLYLINE') == 60
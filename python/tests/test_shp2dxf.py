@@ -0,0 +1,81 @@
+""" tests of shp2dxf, GDAL/OGR needed """
+import json
+import pytest
+import ezdxf
+from ezdxf.lldxf.tagwriter import TagCollector
+pytest.importorskip('osgeo')
+import shp2dxf
+from shp2dxf import Shp2Dxf
+from block_manifest import HANDLE_CODES
+
+class Field():
+    """ field definition of a fake layer """
+    def __init__(self, name, field_type):
+        self.name = name
+        self.field_type = field_type
+
+    def GetType(self):
+        return self.field_type
+
+class Layer():
+    """ fake layer with a schema only """
+    schema = [Field('kind', shp2dxf.ogr.OFTString),
+              Field('cls', shp2dxf.ogr.OFTInteger)]
+
+def test_attribute_filter_none():
+    where = Shp2Dxf.attribute_filter(
+        Layer(), [(0, 'ALL', ['kind', 'cls'], [['road', 'None'], ['None', '2']], None, None)])
+    assert where == """(("kind" IN ('road', 'None') OR "kind" IS NULL) AND """ \
+        """("cls" IN (2) OR "cls" IS NULL))"""
+
+def feature_collection(geoms):
+    """ GeoJSON feature collection of geometries """
+    return {'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'properties': {'id': i}, 'geometry': g}
+                         for i, g in enumerate(geoms)]}
+
+@pytest.fixture
+def sources(tmp_path):
+    """ GeoJSON datasources, rules and template """
+    data = tmp_path / 'data'
+    data.mkdir()
+    lines = [{'type': 'LineString',
+              'coordinates': [[i, 0], [i + 0.5, 0.01], [i + 1, 0], [i + 1, 1]]}
+             for i in range(10)]
+    n = 6   # grid of polygons sharing edges, jagged by midpoints
+    polygons = []
+    for i in range(n):
+        for j in range(n):
+            ring = [[i, j], [i + 0.5, j + 0.01 * (i % 2)], [i + 1, j],
+                    [i + 1 - 0.01 * (j % 2), j + 0.5], [i + 1, j + 1],
+                    [i + 0.5, j + 1 + 0.01 * ((i + 1) % 2)], [i, j + 1],
+                    [i - 0.01 * ((j + 1) % 2), j + 0.5], [i, j]]
+            polygons.append({'type': 'Polygon', 'coordinates': [ring]})
+    (data / 'lines.geojson').write_text(json.dumps(feature_collection(lines)))
+    (data / 'parcels.geojson').write_text(json.dumps(feature_collection(polygons)))
+    (tmp_path / 'rules.txt').write_text(
+        'lines.geojson|*;ROAD;;;;0.1\nparcels.geojson|*;ALL;;;;vw:0.05\n')
+    templ = ezdxf.new('R2010')
+    for name in ('ROAD', 'ALL'):
+        templ.layers.add(name)
+    templ.saveas(tmp_path / 'templ.dxf')
+    return tmp_path
+
+def convert(path, jobs):
+    """ convert the sources and return the tags of the entities without handles """
+    out = path / f'out{jobs}.dxf'
+    Shp2Dxf(str(path / 'data'), str(path / 'templ.dxf'), str(out),
+            str(path / 'rules.txt'), 'utf-8', False, jobs=jobs).convert()
+    collector = TagCollector(dxfversion='AC1024')
+    for entity in ezdxf.readfile(out).modelspace():
+        entity.export_dxf(collector)
+    return [(tag.code, tag.value) for tag in collector.tags
+            if tag.code not in HANDLE_CODES]
+
+def test_serial_same_as_jobs(sources, monkeypatch):
+    pytest.importorskip('shapely')    # simplification rules
+    # serial mode reads in small chunks, processes read whole layers
+    monkeypatch.setattr(shp2dxf, 'CHUNK_SIZE', 5)
+    serial = convert(sources, 1)
+    assert serial == convert(sources, 2)
+    assert sum(1 for tag in serial if tag == (0, 'LWPOLYLINE')) == 46